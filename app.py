@@ -1,35 +1,44 @@
+import importlib
 import streamlit as st
-import hw1
-import hw2
-import hw3
-import hw5
+import tracing
 
+# Page name -> module providing run(). Modules are imported on first selection
+# only, so the Home page never pays for chromadb, the LLM SDKs or secrets.
+PAGES = {
+    "Homework 1": "hw1",
+    "Homework 2": "hw2",
+    "Homework 3": "hw3",
+    "Homework 5": "hw5",
+}
 
-# Title for the main page
-st.title('HOMEWORK MANAGER')
 
-# Sidebar selection
-st.sidebar.title("Navigation")
-selection = st.sidebar.radio("Go to", ["Home", "Homework 1", "Homework 2", "Homework 3", "Homework 5"])
+def load_page(name):
+    return importlib.import_module(PAGES[name])
 
-# Home Page
-if selection == "Home":
-    st.write("""
-    ## Welcome to the Dhruv's Streamlit Homework App
-    Use the sidebar to navigate to different Homework.
-    """)
 
-# HW 1 Page
-elif selection == "Homework 1":
-    hw1.run()
+def main():
+    # Title for the main page
+    st.title('HOMEWORK MANAGER')
 
-# HW 2 Page
-elif selection == "Homework 2":
-    hw2.run()
+    # Sidebar selection
+    st.sidebar.title("Navigation")
+    selection = st.sidebar.radio("Go to", ["Home", *PAGES])
 
-elif selection == "Homework 3":
-    hw3.run()
+    # Home Page
+    if selection == "Home":
+        st.write("""
+        ## Welcome to the Dhruv's Streamlit Homework App
+        Use the sidebar to navigate to different Homework.
+        """)
 
+    # Homework pages
+    else:
+        load_page(selection).run()
+        # Per-stage timings of the page's latest request
+        tracing.sidebar_panel()
 
-elif selection == "Homework 5":
-    hw5.run()
\ No newline at end of file
+
+# Streamlit runs this script as __main__. The PDF extraction workers started by
+# ingest import it as __mp_main__ and must not run the app.
+if __name__ == "__main__":
+    main()
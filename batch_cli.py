@@ -0,0 +1,181 @@
+"""Headless batch runs of the hw2 URL summarizer and the hw5 course Q&A.
+
+Usage:
+  python batch_cli.py summarize urls.txt -o summaries.jsonl [--provider openai] [--advanced]
+                      [--summary-type "Short Summary"] [--language English] [--workers 8]
+  python batch_cli.py ask questions.txt -o answers.jsonl [--course default] [--user shared]
+                      [--workers 4]
+
+Input files hold one URL or question per line; blank lines and # comments are
+skipped. Each result is appended to the output JSONL as soon as it finishes, so
+rerunning with the same output resumes where the last run stopped (failed items
+are retried). API keys come from .streamlit/secrets.toml, as for the app.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit.logger
+
+# Cached resources and secrets work without a Streamlit server; silence the bare-mode warnings
+streamlit.logger.set_log_level("error")
+
+import streamlit as st  # noqa: E402
+
+import hw2  # noqa: E402
+import hw5  # noqa: E402
+import llm_stream  # noqa: E402
+import response_cache  # noqa: E402
+import url_fetch  # noqa: E402
+
+SECRET_NAMES = {
+    "openai": "openai_api_key",
+    "anthropic": "anthropic_api_key",
+    "cohere": "cohere_api_key",
+}
+REPORT_EVERY = 10  # items between progress lines
+
+
+def read_items(path):
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def completed_items(output):
+    # Inputs already answered successfully by an earlier run into the same file
+    done = set()
+    try:
+        with open(output, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted run
+                if record.get("ok"):
+                    done.add(record["input"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def summarize_url(url, provider, api_key, model, summary_type, language):
+    timings = {}
+    started = time.perf_counter()
+    content = url_fetch.fetch_main_content(url)
+    timings["fetch_s"] = time.perf_counter() - started
+    if content is None:
+        raise ValueError("could not extract the main content of the page")
+
+    started = time.perf_counter()
+    cache = response_cache.get_shared_cache("hw2_summaries")
+    key = hw2.summary_key(provider, model, content, summary_type, language)
+    summary = cache.get(key)
+    if summary is None:
+        messages = hw2.summary_messages(provider, api_key, model, content, summary_type, language)
+        summary = "".join(hw2.stream_summary_text(provider, api_key, model, messages)).strip()
+        if summary:
+            cache.put(key, summary)
+    timings["summarize_s"] = time.perf_counter() - started
+    return {"result": summary, "chars": len(content), "model": model}, timings
+
+
+def answer_question(question, collection, api_key):
+    timings = {}
+    started = time.perf_counter()
+    passages = hw5.query_passages(collection, question, hw5.get_embedding_function())
+    context = hw5.relevant_context(passages, question)
+    timings["retrieve_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    answer = llm_stream.complete_text("openai", api_key, hw5.ANSWER_MODEL, hw5.answer_messages(context, question),
+                                      max_tokens=hw5.ANSWER_MAX_TOKENS)
+    timings["generate_s"] = time.perf_counter() - started
+    return {"result": answer, "passages": len(passages), "model": hw5.ANSWER_MODEL}, timings
+
+
+def run_batch(items, work, output, workers):
+    # work(item) -> (fields, timings). Records are appended and flushed one by one.
+    skipped = completed_items(output)
+    pending = [item for item in items if item not in skipped]
+    print(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run "
+          f"with {workers} workers", file=sys.stderr)
+
+    def timed(item):
+        started = time.perf_counter()
+        record = {"input": item}
+        try:
+            fields, timings = work(item)
+            record.update(ok=True, **fields)
+        except Exception as e:
+            timings = {}
+            record.update(ok=False, error=f"{type(e).__name__}: {e}")
+        record["timings"] = {**timings, "total_s": time.perf_counter() - started}
+        return record
+
+    done = failed = 0
+    started = time.perf_counter()
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed(pool.submit(timed, item) for item in pending):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            done += 1
+            failed += not record["ok"]
+            if done % REPORT_EVERY == 0 or done == len(pending):
+                elapsed = time.perf_counter() - started
+                print(f"{done}/{len(pending)} done, {failed} failed, "
+                      f"{done / elapsed * 60:.1f} items/min", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"{rate:.1f} items/minute ({done} items in {elapsed:.1f}s, {failed} failed)")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summarize_parser = commands.add_parser("summarize", help="summarize every URL in a file (hw2)")
+    summarize_parser.add_argument("input")
+    summarize_parser.add_argument("-o", "--output", required=True)
+    summarize_parser.add_argument("--provider", choices=sorted(SECRET_NAMES), default="openai")
+    summarize_parser.add_argument("--advanced", action="store_true", help='same as "Use Advanced Model"')
+    summarize_parser.add_argument("--summary-type", default="Short Summary",
+                                  choices=("Short Summary", "Detailed Summary", "Bullet Points"))
+    summarize_parser.add_argument("--language", default="English")
+    summarize_parser.add_argument("--workers", type=int, default=8)
+
+    ask_parser = commands.add_parser("ask", help="answer every question in a file from a course collection (hw5)")
+    ask_parser.add_argument("input")
+    ask_parser.add_argument("-o", "--output", required=True)
+    ask_parser.add_argument("--course", default="default")
+    ask_parser.add_argument("--user", default="shared", help="collection owner, as in the app")
+    ask_parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+    items = read_items(args.input)
+
+    if args.command == "summarize":
+        api_key = st.secrets[SECRET_NAMES[args.provider]]
+        model = hw2.summary_model(args.provider, args.advanced)
+
+        def work(url):
+            return summarize_url(url, args.provider, api_key, model, args.summary_type, args.language)
+    else:
+        api_key = st.secrets["openai_api_key"]
+        collection = hw5.get_store_manager().collection((args.user, args.course), hw5.get_embedding_function())
+        print(f"Collection {collection.name}: {collection.count()} chunks", file=sys.stderr)
+
+        def work(question):
+            return answer_question(question, collection, api_key)
+
+    failed = run_batch(items, work, args.output, args.workers)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
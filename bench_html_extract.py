@@ -0,0 +1,98 @@
+"""Compare HTML main-content extraction on saved pages: ms/page and peak RSS.
+
+Usage: python bench_html_extract.py [page.html ...] [--repeat N]
+
+Engines are the previous BeautifulSoup/html.parser extraction and each
+html_extract backend, each run in its own subprocess so peak RSS is
+measured in isolation. Defaults to the pages in fixtures/html.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import html_extract
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+
+def bs4_main_text(content):
+    # The extraction hw2 used before html_extract
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, "html.parser")
+    content_div = soup.find("article") or soup.find(id="bodyContent") or soup.find("main")
+    return content_div.get_text(separator=" ", strip=True) if content_div else None
+
+
+def bs4_page_text(content):
+    # The extraction hw3 used before html_extract
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, "html.parser")
+    for script in soup(["script", "style"]):
+        script.decompose()
+    return " ".join(soup.get_text().split())
+
+
+def engines():
+    found = {"bs4": (bs4_main_text, bs4_page_text)}
+    for backend in html_extract.BACKENDS:
+        found[backend] = (
+            lambda content, backend=backend: html_extract.extract_main_text(content, backend),
+            lambda content, backend=backend: html_extract.extract_page_text(content, backend),
+        )
+    return found
+
+
+def run_engine(name, paths, repeat):
+    main_text, page_text = engines()[name]
+    pages = [open(path, "rb").read() for path in paths]
+    chars = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages:
+            chars += len(main_text(content) or "")
+            chars += len(page_text(content))
+    elapsed = time.perf_counter() - started
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss_kb //= 1024
+    runs = repeat * len(pages)
+    return {
+        "engine": name,
+        "pages": runs,
+        "chars": chars,
+        # one main-content and one whole-page extraction per page
+        "ms_per_page": elapsed * 1000 / runs if runs else 0.0,
+        "peak_rss_mb": peak_rss_kb / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+    if args.engine:
+        print(json.dumps(run_engine(args.engine, paths, args.repeat)))
+        return
+
+    print(f"{len(paths)} pages x {args.repeat} repeats")
+    print(f"{'engine':<12} {'ms/page':>9} {'peak RSS MB':>12} {'chars':>10}")
+    for name in engines():
+        output = subprocess.run(
+            [sys.executable, __file__, "--engine", name, "--repeat", str(args.repeat), *paths],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<12} {result['ms_per_page']:>9.2f} {result['peak_rss_mb']:>12.1f} {result['chars']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Measure import time of the app's modules, cold and warm.
+
+Usage: python bench_imports.py [module ...] [--runs N] [--save FILE] [--compare FILE]
+
+cold: `import module` in a fresh interpreter, dependencies included.
+warm: re-executing only the module itself once its dependencies are loaded,
+      i.e. the module-level work it does on every import.
+With --compare, exits non-zero when a median grows past the tolerance so
+import-time regressions can fail CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["app", "hw1", "hw2", "hw3", "hw5"]
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module({module!r})
+cold = time.perf_counter() - started
+del sys.modules[{module!r}]
+started = time.perf_counter()
+importlib.import_module({module!r})
+warm = time.perf_counter() - started
+print(json.dumps({{"cold": cold, "warm": warm}}))
+"""
+
+
+def measure(module):
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(modules, runs):
+    results = {}
+    for module in modules:
+        samples = [measure(module) for _ in range(runs)]
+        results[module] = {
+            "cold_ms": statistics.median(s["cold"] for s in samples) * 1000,
+            "warm_ms": statistics.median(s["warm"] for s in samples) * 1000,
+        }
+    return results
+
+
+def regressions(results, baseline, tolerance, floor_ms):
+    found = []
+    for module, timings in results.items():
+        for kind, value in timings.items():
+            previous = baseline.get(module, {}).get(kind)
+            if previous is not None and value > max(previous * (1 + tolerance), previous + floor_ms):
+                found.append(f"{module} {kind}: {previous:.1f} ms -> {value:.1f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to check against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative growth")
+    parser.add_argument("--floor-ms", type=float, default=20.0, help="ignore growth below this")
+    args = parser.parse_args()
+
+    results = benchmark(args.modules, args.runs)
+    print(f"{'module':<12} {'cold ms':>9} {'warm ms':>9}")
+    for module, timings in results.items():
+        print(f"{module:<12} {timings['cold_ms']:>9.1f} {timings['warm_ms']:>9.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance, args.floor_ms)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
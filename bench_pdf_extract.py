@@ -0,0 +1,94 @@
+"""Compare PDF extraction backends on pages/s and peak RSS.
+
+Usage: python bench_pdf_extract.py [file.pdf ...] [--pages N] [--repeat N]
+
+Each backend runs in its own subprocess so peak RSS is measured in
+isolation. Without PDF arguments a synthetic document is generated.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pdf_text
+
+
+def make_sample_pdf(path, pages):
+    fitz = pdf_text.fitz
+    doc = fitz.open()
+    paragraph = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+                 "tempor incididunt ut labore et dolore magna aliqua. ") * 3
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Page {i + 1}\n" + paragraph * 12, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def run_backend(backend, paths, repeat):
+    # Worker mode: extract every file `repeat` times, streaming page by page
+    pages = 0
+    chars = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            for text in pdf_text.iter_pages(data, backend):
+                pages += 1
+                chars += len(text)
+    elapsed = time.perf_counter() - started
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss_kb //= 1024
+    return {
+        "backend": backend,
+        "pages": pages,
+        "chars": chars,
+        "seconds": elapsed,
+        "pages_per_s": pages / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_kb / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--pages", type=int, default=200, help="pages in the synthetic PDF")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.pdfs, args.repeat)))
+        return
+
+    paths = args.pdfs
+    tmp = None
+    if not paths:
+        tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        tmp.close()
+        make_sample_pdf(tmp.name, args.pages)
+        paths = [tmp.name]
+
+    try:
+        print(f"{'backend':<10} {'pages':>7} {'seconds':>9} {'pages/s':>9} {'peak RSS MB':>12}")
+        for backend in sorted(pdf_text.BACKENDS):
+            output = subprocess.run(
+                [sys.executable, __file__, "--backend", backend, "--repeat", str(args.repeat), *paths],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:<10} {result['pages']:>7} {result['seconds']:>9.2f} "
+                  f"{result['pages_per_s']:>9.1f} {result['peak_rss_mb']:>12.1f}")
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
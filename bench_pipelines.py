@@ -0,0 +1,315 @@
+"""Offline latency/throughput benchmark of the hw2, hw3 and hw5 pipelines.
+
+Usage: python bench_pipelines.py [hw2 hw3 hw5] [--rounds N] [--concurrency N]
+                                 [--ttft-ms MS] [--token-ms MS] [--reply-tokens N]
+                                 [--embed-ms MS] [--pdf file.pdf ...] [--json FILE]
+
+A local HTTP server stands in for the network: it serves fixtures/html and
+fakes the OpenAI chat (streamed) and embedding endpoints with configurable
+latency, so runs are reproducible and need no API keys. Every request is
+traced with tracing.trace, and the report gives items/s, total latency and the
+median time per stage. Without --pdf, hw5 ingests a generated PDF.
+
+Chunking and token counts use tiktoken's cl100k_base, which must already be
+in tiktoken's local cache. Provider rate limits are lifted for the run, so the
+numbers measure the pipelines and not the scheduler's throttling.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit.logger
+
+# Cached resources work without a Streamlit server; silence the bare-mode warnings
+streamlit.logger.set_log_level("error")
+
+import hw2  # noqa: E402
+import hw3  # noqa: E402
+import hw5  # noqa: E402
+import ingest  # noqa: E402
+import llm_stream  # noqa: E402
+import pdf_text  # noqa: E402
+import tracing  # noqa: E402
+import url_fetch  # noqa: E402
+from scheduler import scheduler  # noqa: E402
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HTML_DIR = os.path.join(ROOT, "fixtures", "html")
+API_KEY = "bench-key"
+MODEL = "gpt-3.5-turbo"
+EMBEDDING_DIMENSIONS = 256
+
+QUESTIONS = [
+    "What is the main topic of these pages?",
+    "Summarize the key dates mentioned.",
+    "Which people or organizations are named?",
+    "What problems are described and how are they solved?",
+    "List the most important numbers and what they measure.",
+    "What does the text say about installation or setup?",
+    "Are there any open questions left at the end?",
+    "Give three facts that appear on page 2.",
+]
+
+
+def fake_embedding(text):
+    # Hashed bag of words: similar texts get similar vectors, so retrieval still ranks
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None  # argparse namespace, set by start_server
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(HTML_DIR, os.path.basename(self.path.split("?")[0]))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self.embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self.chat(request)
+        else:
+            self.send_error(404)
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def embeddings(self, request):
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        time.sleep(self.options.embed_ms / 1000)
+        self.send_json({
+            "object": "list",
+            "model": request.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(t)} for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def chat(self, request):
+        words = min(self.options.reply_tokens, request.get("max_tokens") or self.options.reply_tokens)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            payload = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+        time.sleep(self.options.ttft_ms / 1000)
+        event({"role": "assistant", "content": ""})
+        for i in range(words):
+            if i:
+                time.sleep(self.options.token_ms / 1000)
+            event({"content": f"word{i} "})
+        event({}, "stop")
+        self.write_chunk("data: [DONE]\n\n")
+        self.write_chunk("")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming page reads stop early and pooled connections get dropped; not errors here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(options):
+    FakeAPIHandler.options = options
+    server = FakeAPIServer(("127.0.0.1", 0), FakeAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_hw2(base_url, options, traces):
+    urls = [f"{base_url}/{name}" for name in sorted(os.listdir(HTML_DIR))]
+
+    def summarize_page(url):
+        with tracing.trace("hw2 summary", store=traces):
+            content = url_fetch.fetch_main_content(url)
+            if content is None:
+                raise ValueError(f"no main content in {url}")
+            messages = hw2.summary_messages("openai", API_KEY, MODEL, content, "Short Summary", "English")
+            return "".join(hw2.stream_summary_text("openai", API_KEY, MODEL, messages))
+
+    return urls * options.rounds, summarize_page
+
+
+def run_hw3(base_url, options, traces):
+    urls = [f"{base_url}/wiki_page.html", f"{base_url}/docs_main.html"]
+
+    def answer(question):
+        with tracing.trace("hw3 answer", store=traces):
+            context = hw3.build_url_context(urls, question, hw3.context_budget("OpenAI GPT-3.5", question, 0))
+            return llm_stream.complete_text("openai", API_KEY, MODEL, hw3.openai_messages(context, question, []))
+
+    return QUESTIONS * options.rounds, answer
+
+
+def run_hw5(base_url, options, traces, workdir):
+    from embedding_cache import CachedEmbeddingFunction
+
+    def openai_embeddings(texts):
+        return llm_stream.embed_openai(API_KEY, hw5.EMBEDDING_MODEL, texts)
+
+    embedding_function = CachedEmbeddingFunction(openai_embeddings, hw5.EMBEDDING_MODEL,
+                                                 path=os.path.join(workdir, "embeddings.sqlite3"))
+    store = hw5.vector_store.StoreManager(hw5.load_chromadb(), path=os.path.join(workdir, "chroma"))
+    collection = store.collection(("bench", "course"), embedding_function)
+
+    paths = options.pdf
+    if not paths:
+        import bench_pdf_extract
+        paths = [os.path.join(workdir, "course_pack.pdf")]
+        bench_pdf_extract.make_sample_pdf(paths[0], options.pdf_pages)
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    with tracing.trace("hw5 ingest", store=traces):
+        stats = ingest.ingest_pdfs(collection, embedding_function, files)
+    print(f"hw5 ingest: {stats.summary()}", file=sys.stderr)
+
+    def answer(question):
+        with tracing.trace("hw5 answer", store=traces):
+            passages = hw5.query_passages(collection, question, embedding_function)
+            context = hw5.relevant_context(passages, question)
+            return llm_stream.complete_text("openai", API_KEY, hw5.ANSWER_MODEL, hw5.answer_messages(context, question),
+                                            max_tokens=hw5.ANSWER_MAX_TOKENS)
+
+    return QUESTIONS * options.rounds, answer
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def summarize_traces(traces, label, wall_seconds, errors):
+    selected = [t for t in traces if t.label == label]
+    stages = {}
+    for t in selected:
+        for stage, ms in t.breakdown().items():
+            stages.setdefault(stage, []).append(ms)
+    generation = [span for t in selected for span in t.spans if span["stage"] == "generation"]
+    ttfts = [span["ttft_ms"] for span in generation if span.get("ttft_ms") is not None]
+    totals = [t.seconds * 1000 for t in selected]
+    return {
+        "items": len(selected),
+        "errors": errors,
+        "wall_s": wall_seconds,
+        "items_per_s": len(selected) / wall_seconds if wall_seconds else 0.0,
+        "p50_ms": percentile(totals, 0.5),
+        "p95_ms": percentile(totals, 0.95),
+        "ttft_p50_ms": percentile(ttfts, 0.5),
+        "tokens_in": sum(span.get("tokens_in", 0) for span in generation),
+        "tokens_out": sum(span.get("tokens_out", 0) for span in generation),
+        "stages_p50_ms": {stage: statistics.median(stages[stage])
+                          for stage in tracing.STAGES if stage in stages},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pipelines", nargs="*", default=["hw2", "hw3", "hw5"])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ttft-ms", type=float, default=150)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--embed-ms", type=float, default=20)
+    parser.add_argument("--pdf", nargs="*", default=[])
+    parser.add_argument("--pdf-pages", type=int, default=40)
+    parser.add_argument("--json", help="write the summary and every trace to this file")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args)
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    unlimited = {"rpm": 10 ** 9, "burst": 10 ** 6, "concurrency": 256}
+    scheduler.limits = {"openai": unlimited, "openai_embeddings": unlimited}
+    workdir = tempfile.mkdtemp(prefix="bench_pipelines_")
+    pdf_text.CACHE_DIR = os.path.join(workdir, "pdf_text_cache")
+
+    traces, results = [], {}
+    try:
+        for name in args.pipelines:
+            if name == "hw5":
+                items, work = run_hw5(base_url, args, traces, workdir)
+            else:
+                items, work = {"hw2": run_hw2, "hw3": run_hw3}[name](base_url, args, traces)
+            label = {"hw2": "hw2 summary", "hw3": "hw3 answer", "hw5": "hw5 answer"}[name]
+
+            def attempt(item):
+                try:
+                    work(item)
+                    return None
+                except Exception as e:
+                    return e
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                failures = [e for e in pool.map(attempt, items) if e is not None]
+            results[name] = summarize_traces(traces, label, time.perf_counter() - started, len(failures))
+            for error in failures[:3]:
+                print(f"{name}: {type(error).__name__}: {error}", file=sys.stderr)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'pipeline':<9} {'items':>6} {'errors':>6} {'items/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'ttft ms':>8}  stages (p50 ms)")
+    for name, result in results.items():
+        stages = ", ".join(f"{stage} {ms:.1f}" for stage, ms in result["stages_p50_ms"].items())
+        p50, p95, ttft = (f"{result[key]:.1f}" if result[key] is not None else "-"
+                          for key in ("p50_ms", "p95_ms", "ttft_p50_ms"))
+        print(f"{name:<9} {result['items']:>6} {result['errors']:>6} {result['items_per_s']:>8.2f} "
+              f"{p50:>8} {p95:>8} {ttft:>8}  {stages}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": results,
+                       "traces": [t.to_dict() for t in traces]}, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
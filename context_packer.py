@@ -0,0 +1,83 @@
+import re
+
+from tokens import count_tokens, get_encoding
+
+# Context windows (tokens) of the models the pages use
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gemini-pro": 30720,
+    "command": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+MAX_CONTEXT_TOKENS = 3000  # more context rarely helps and costs latency
+ANSWER_RESERVE = 1024
+DUPLICATE_THRESHOLD = 0.8  # Jaccard similarity of word shingles
+SHINGLE_SIZE = 5
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def context_budget(model, reserved_tokens=0, answer_tokens=ANSWER_RESERVE, cap=MAX_CONTEXT_TOKENS):
+    # Tokens left for context once the rest of the prompt and the answer are accounted for
+    window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return max(0, min(cap, window - reserved_tokens - answer_tokens))
+
+
+def _shingles(text):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack(passages, budget_tokens, threshold=DUPLICATE_THRESHOLD):
+    # passages: [{"text", "score", "source"}]. Greedily keeps the highest scoring
+    # passages that fit the budget, skipping near-duplicates of passages already
+    # kept. Ties keep their original order. The best passage is truncated rather
+    # than dropped when it alone exceeds the budget.
+    encoding = get_encoding()
+    selected, kept_shingles = [], []
+    remaining = budget_tokens
+    for passage in sorted(passages, key=lambda p: -p["score"]):
+        shingles = _shingles(passage["text"])
+        if any(_similarity(shingles, kept) >= threshold for kept in kept_shingles):
+            continue
+        cost = count_tokens(_block(passage))
+        if cost > remaining:
+            if selected:
+                continue
+            # Trim the best passage to the budget, re-checking the exact block size
+            tokens = encoding.encode(passage["text"], disallowed_special=())
+            keep = len(tokens) - (cost - remaining)
+            while keep > 0:
+                trimmed = {**passage, "text": encoding.decode(tokens[:keep])}
+                cost = count_tokens(_block(trimmed))
+                if cost <= remaining:
+                    break
+                keep -= cost - remaining
+            if keep <= 0:
+                break
+            passage = trimmed
+        selected.append(passage)
+        kept_shingles.append(shingles)
+        remaining -= cost
+    return selected
+
+
+def _header(passage):
+    return f"From {passage['source']}:\n" if passage.get("source") else ""
+
+
+def _block(passage):
+    return f"{_header(passage)}{passage['text']}\n\n"
+
+
+def format_context(passages):
+    return "".join(_block(p) for p in passages)
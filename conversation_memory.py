@@ -0,0 +1,68 @@
+from tokens import count_tokens
+
+TOKEN_BUDGET = 5000
+QUESTION_PAIRS = 5
+TOKENS_PER_MESSAGE = 3  # chat format overhead per message for gpt-3.5-turbo / gpt-4
+KEEP_RECENT = 1  # messages kept verbatim next to the rolling summary
+
+SUMMARY_PROMPT = ("Update the running summary of a conversation with the new messages. "
+                  "Keep facts, names and open questions; stay under 200 words.\n\n"
+                  "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:")
+
+
+class ConversationMemory:
+    # Tracks a growing list of chat messages. Token counts are computed once per
+    # message, the token window slides forward as messages arrive, and the
+    # rolling summary only ever folds in messages it has not seen yet.
+    def __init__(self, token_budget=TOKEN_BUDGET, question_pairs=QUESTION_PAIRS):
+        self.token_budget = token_budget
+        self.question_pairs = question_pairs
+        self.messages = []
+        self.token_counts = []
+        self.window_start = 0
+        self.window_tokens = 0
+        self.summary = ""
+        self.summarized = 0  # messages[:summarized] are folded into the summary
+
+    def sync(self, messages):
+        # Counts only messages appended since the last call
+        if len(messages) < len(self.token_counts) or (self.messages is not messages and self.messages):
+            self.__init__(self.token_budget, self.question_pairs)
+        self.messages = messages
+        for message in messages[len(self.token_counts):]:
+            tokens = count_tokens(message["content"]) + TOKENS_PER_MESSAGE
+            self.token_counts.append(tokens)
+            self.window_tokens += tokens
+            while self.window_tokens > self.token_budget and self.window_start < len(self.token_counts) - 1:
+                self.window_tokens -= self.token_counts[self.window_start]
+                self.window_start += 1
+        return self
+
+    def token_window(self):
+        # Newest messages that fit the token budget (always at least the last one)
+        return self.messages[self.window_start:]
+
+    def question_window(self):
+        return self.messages[-2 * self.question_pairs:]
+
+    def summary_window(self, summarize):
+        # summarize(prompt) -> text. Folds unsummarized older messages into the
+        # rolling summary, then returns it alongside the most recent messages.
+        fold_until = max(len(self.messages) - KEEP_RECENT, self.summarized)
+        new_messages = self.messages[self.summarized:fold_until]
+        if new_messages:
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in new_messages)
+            self.summary = summarize(SUMMARY_PROMPT.format(summary=self.summary or "(empty)",
+                                                           messages=transcript)).strip()
+            self.summarized = fold_until
+        recent = self.messages[fold_until:]
+        if not self.summary:
+            return recent
+        return [{"role": "system", "content": f"Summary of the conversation so far: {self.summary}"}, *recent]
+
+    def tokens(self, messages):
+        # Exact prompt tokens for a list of messages, using cached counts where possible
+        start = len(self.messages) - len(messages)
+        if messages and start >= 0 and self.messages[start:] == messages:
+            return sum(self.token_counts[start:])
+        return sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+CACHE_PATH = os.path.join(".embedding_cache", "embeddings.sqlite3")
+MAX_ENTRIES = 200_000
+MEMORY_ENTRIES = 2_048
+
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    # Disk-backed, size-bounded LRU in front of another embedding function,
+    # with a small in-memory tier for repeat queries.
+    def __init__(self, embedding_function, model_name, path=CACHE_PATH,
+                 max_entries=MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [cache_key(self.model_name, text) for text in input]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            found.update(self._load([key for key in keys if key not in found]))
+
+        # Embed each distinct missing text once
+        missing = OrderedDict()
+        for key, text in zip(keys, input):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            fresh = {key: [float(x) for x in vector] for key, vector in zip(missing, vectors)}
+            with self._lock:
+                self._store(fresh)
+            found.update(fresh)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            for key in keys:
+                self._remember(key, found[key])
+        return [found[key] for key in keys]
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys):
+        found = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._db.commit()
+        return found
+
+    def _store(self, vectors):
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, array("f", vector).tobytes(), now) for key, vector in vectors.items()],
+        )
+        # Evict least recently used rows once over budget
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+                "memory_entries": len(self._memory),
+            }
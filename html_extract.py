@@ -0,0 +1,178 @@
+import codecs
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Main content containers, most specific first
+MAIN_CANDIDATES = (("tag", "article"), ("id", "bodyContent"), ("tag", "main"))
+# The whole document
+PAGE_CANDIDATES = (("root", None),)
+
+MAX_CHARS = 100_000
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+             "meta", "param", "source", "track", "wbr"}
+# Never part of the extracted text
+SKIP_TAGS = {"script", "style", "template", "noscript", "svg",
+             "nav", "aside", "footer", "form", "iframe", "button"}
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+
+class ContentCollector:
+    # Parser target that captures the text of the first container of each
+    # candidate kind while skipping boilerplate. done is set once the best
+    # possible candidate is complete or enough text has been captured.
+    def __init__(self, candidates=MAIN_CANDIDATES, max_chars=MAX_CHARS):
+        self.candidates = candidates
+        self.max_chars = max_chars
+        self.stack = []
+        self.captures = {}  # candidate -> [depth or None when closed, pieces, length]
+        self.skip_depth = None
+        self.done = False
+        if candidates[0][0] == "root":
+            self.captures[candidates[0]] = [0, [], 0]
+
+    def _candidate(self, tag, attrib):
+        for kind, value in self.candidates:
+            if (kind == "tag" and tag == value) or (kind == "id" and attrib.get("id") == value):
+                if (kind, value) not in self.captures:
+                    return kind, value
+        return None
+
+    def start(self, tag, attrib):
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag in SKIP_TAGS and self.skip_depth is None:
+            self.skip_depth = len(self.stack)
+        if self.skip_depth is None:
+            candidate = self._candidate(tag, attrib)
+            if candidate is not None:
+                self.captures[candidate] = [len(self.stack), [], 0]
+
+    def end(self, tag):
+        if tag not in self.stack:
+            return
+        while self.stack and self.stack.pop() != tag:
+            pass
+        depth = len(self.stack)
+        if self.skip_depth is not None and self.skip_depth > depth:
+            self.skip_depth = None
+        for candidate, capture in self.captures.items():
+            if capture[0] is not None and capture[0] > depth:
+                capture[0] = None
+                if candidate == self.candidates[0]:
+                    self.done = True
+
+    def data(self, data):
+        if self.skip_depth is not None:
+            return
+        text = data.strip()
+        if not text:
+            return
+        for capture in self.captures.values():
+            if capture[0] is not None:
+                capture[1].append(text)
+                capture[2] += len(text) + 1
+                if capture[2] >= self.max_chars:
+                    self.done = True
+
+    def close(self):
+        for candidate in self.candidates:
+            if candidate in self.captures:
+                return " ".join(self.captures[candidate][1])[:self.max_chars]
+        return None
+
+
+class _StdlibFeeder(HTMLParser):
+    # Adapts html.parser callbacks to a ContentCollector
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+class StreamingExtractor:
+    # Incremental extraction: feed decoded text as it arrives, stop reading once
+    # done is set, then call result()
+    def __init__(self, candidates=MAIN_CANDIDATES, max_chars=MAX_CHARS, backend=None):
+        self.backend = backend or DEFAULT_BACKEND
+        self.collector = ContentCollector(candidates, max_chars)
+        if self.backend == "lxml":
+            self.parser = etree.HTMLParser(target=self.collector)
+        elif self.backend == "html.parser":
+            self.parser = _StdlibFeeder(self.collector)
+        else:
+            raise ValueError(f"Unknown HTML backend {self.backend!r}, choose from {BACKENDS}")
+
+    @property
+    def done(self):
+        return self.collector.done
+
+    def feed(self, text):
+        if text:
+            self.parser.feed(text)
+
+    def result(self):
+        try:
+            self.parser.close()
+        except Exception:
+            # libxml2 complains about documents cut off by the byte budget
+            pass
+        return self.collector.close()
+
+
+BACKENDS = ("lxml", "html.parser") if etree is not None else ("html.parser",)
+DEFAULT_BACKEND = BACKENDS[0]
+
+
+def _text_encoding(name):
+    # Canonical codec name, or None for unknown names and bytes-to-bytes codecs (base64, rot13...)
+    try:
+        info = codecs.lookup(name)
+    except LookupError:
+        return None
+    return info.name if getattr(info, "_is_text_encoding", True) else None
+
+
+def detect_encoding(content, declared=None):
+    # Header charset, then <meta charset>, then utf-8; names Python cannot decode with are skipped
+    if declared and _text_encoding(declared):
+        return _text_encoding(declared)
+    match = _CHARSET_RE.search(content[:4096])
+    if match:
+        encoding = _text_encoding(match.group(1).decode("ascii", errors="replace"))
+        if encoding:
+            return encoding
+    return "utf-8"
+
+
+def _decode(html):
+    if isinstance(html, bytes):
+        return html.decode(detect_encoding(html), errors="replace")
+    return html
+
+
+def extract_main_text(html, backend=None, max_chars=MAX_CHARS):
+    # Text of the first article, #bodyContent or main container, or None
+    extractor = StreamingExtractor(MAIN_CANDIDATES, max_chars, backend)
+    extractor.feed(_decode(html))
+    return extractor.result()
+
+
+def extract_page_text(html, backend=None, max_chars=MAX_CHARS):
+    # Whole-page text with scripts, styles and navigation boilerplate removed
+    extractor = StreamingExtractor(PAGE_CANDIDATES, max_chars, backend)
+    extractor.feed(_decode(html))
+    return extractor.result() or ""
@@ -1,19 +1,24 @@
 import streamlit as st
-import openai
-import PyPDF2
+import hashlib
+import llm_clients
+import llm_stream
+import pdf_text
+import retrieval
+import tracing
+
+
+# Build the chunk index once per distinct upload and share it across reruns
+@st.cache_resource(max_entries=16)
+def get_document_index(document_digest, _document):
+    return retrieval.build_index(_document)
 
 def run():
     st.subheader("Dhruv's Question Answering Chatbot")
 
     # Function to read PDF file
     def read_pdf(uploaded_file):
-        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-        num_pages = len(pdf_reader.pages)
-        text = ""
-        for page_num in range(num_pages):
-            page = pdf_reader.pages[page_num]
-            text += page.extract_text()
-        return text
+        with tracing.stage("pdf_extract", bytes=uploaded_file.size):
+            return pdf_text.extract_text(uploaded_file.getvalue())
 
     # OpenAI API key input
     openai_api_key = st.text_input("OpenAI API Key", type="password")
@@ -21,11 +26,13 @@ def run():
         st.info("Please add your OpenAI API key to continue.", icon="🗝️")
     else:
         # Set up OpenAI client
-        openai.api_key = openai_api_key
+        client = llm_clients.get_openai_client(openai_api_key)
 
         try:
-            # Validate API key
-            openai.Model.list()
+            # Validate API key once per session
+            if st.session_state.get('validated_openai_key') != openai_api_key:
+                client.models.list()
+                st.session_state['validated_openai_key'] = openai_api_key
             st.success("API key is valid!", icon="✅")
         except:
             st.error("Invalid API key!!! Please try again.", icon="❌")
@@ -44,12 +51,16 @@ def run():
                     # Process the uploaded file
                     if st.button("Process"):
                         try:
-                            if uploaded_file.type == "text/plain":
-                                document = uploaded_file.read().decode()
-                            elif uploaded_file.type == "application/pdf":
-                                document = read_pdf(uploaded_file)
+                            with tracing.trace("hw1 process"):
+                                if uploaded_file.type == "text/plain":
+                                    document = uploaded_file.read().decode()
+                                elif uploaded_file.type == "application/pdf":
+                                    document = read_pdf(uploaded_file)
 
-                            st.session_state['document'] = document
+                                st.session_state['document'] = document
+                                st.session_state['document_digest'] = hashlib.sha256(document.encode("utf-8")).hexdigest()
+                                with tracing.stage("chunk"):
+                                    get_document_index(st.session_state['document_digest'], document)
                             st.success("File processed successfully!")
                         except Exception as e:
                             st.error("Error processing file. Please try again.")
@@ -63,20 +74,24 @@ def run():
 
                     if 'document' in st.session_state and question:
                         try:
-                            messages = [
-                                {
-                                    "role": "user",
-                                    "content": f"Here's a document: {st.session_state['document']} \n\n---\n\n {question}",
-                                }
-                            ]
-
-                            # Generate an answer using the OpenAI API
-                            response = openai.ChatCompletion.create(
-                                model="gpt-3.5-turbo",
-                                messages=messages
-                            )
+                            with tracing.trace("hw1 answer"):
+                                # Send only the chunks most relevant to the question
+                                with tracing.stage("retrieval", op="bm25"):
+                                    index = get_document_index(st.session_state['document_digest'], st.session_state['document'])
+                                    excerpts = "\n\n...\n\n".join(index.top_chunks(question))
+                                messages = [
+                                    {
+                                        "role": "user",
+                                        "content": f"Here are the most relevant excerpts of a document: {excerpts} \n\n---\n\n {question}",
+                                    }
+                                ]
 
-                            answer = response['choices'][0]['message']['content']
-                            st.write(f"### Answer:\n{answer}")
+                                # Stream the answer from the OpenAI API as it is generated
+                                st.write("### Answer:")
+                                llm_stream.render_stream(
+                                    llm_stream.stream_text("openai", openai_api_key, "gpt-3.5-turbo", messages),
+                                    label="hw1 answer",
+                                )
+                            llm_stream.timing_caption()
                         except Exception as e:
                             st.error("Error generating answer. Please try again.")
\ No newline at end of file
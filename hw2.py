@@ -1,6 +1,52 @@
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+import llm_stream
+import response_cache
+import summarize
+import tracing
+import url_fetch
+
+SUMMARY_PROMPT = "Please provide a {summary_type} of the following content in {language}:\n\n{content}"
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_TEMPERATURE = 0.7
+
+# provider -> (model with "Use Advanced Model", default model)
+SUMMARY_MODELS = {
+    "openai": ("gpt-3.5-turbo", "gpt-4"),
+    "anthropic": ("claude-2.1", "claude-instant-1.2"),
+    "cohere": ("command", "Command-XLarge"),
+}
+
+def summary_model(provider, advanced):
+    return SUMMARY_MODELS[provider][0 if advanced else 1]
+
+def summary_prompts(content):
+    # The prompts a summary of this content goes through (see summary_messages)
+    if summarize.needs_map_reduce(content):
+        return (summarize.MAP_PROMPT, summarize.REDUCE_PROMPT, summarize.CHUNK_TOKENS)
+    return (SUMMARY_PROMPT,)
+
+def summary_key(provider, model, content, summary_type, language):
+    # Everything that shapes the answer
+    return response_cache.make_key(response_cache.content_digest(content), summary_prompts(content),
+                                   provider, model, summary_type, language)
+
+def summary_messages(provider, api_key, model, content, summary_type, language):
+    # Long pages are summarized section by section first (map-reduce)
+    if summarize.needs_map_reduce(content):
+        section_summaries = summarize.map_summaries(provider, api_key, model, summarize.split_sections(content))
+        return summarize.reduce_messages(provider, api_key, model, section_summaries, summary_type, language)
+    prompt = SUMMARY_PROMPT.format(summary_type=summary_type.lower(), language=language, content=content)
+    return [{"role": "user", "content": prompt}]
+
+def stream_summary_text(provider, api_key, model, messages):
+    return llm_stream.stream_text(provider, api_key, model, messages,
+                                  max_tokens=SUMMARY_MAX_TOKENS, temperature=SUMMARY_TEMPERATURE)
+
+# Widget changes rerun the whole page; reuse the extracted page for a while
+@st.cache_data(ttl=url_fetch.CACHE_TTL, show_spinner=False)
+def fetch_main_content(url):
+    return url_fetch.fetch_main_content(url)
 
 def run():
     st.title("URL Content Summarizer")
@@ -26,96 +72,87 @@ def run():
 
     def read_url_content(url):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Extract the main content, focusing on elements with the most relevant content
-            content_div = soup.find('article')  # Common for blogs and news sites
-            if not content_div:
-                content_div = soup.find(id="bodyContent")  # Wikipedia-specific ID
-            if not content_div:
-                content_div = soup.find('main')  # General 'main' tag for main content
-            if not content_div:
+            # Streamed with timeouts and a byte budget; stops once the main content
+            # (article, #bodyContent or main) has been read
+            content = fetch_main_content(url)
+            if content is None:
                 return "Could not extract the main content of the page."
+            return content
 
-            return content_div.get_text(separator=' ', strip=True)
-        
         except requests.RequestException as e:
             st.error(f"Error reading {url}: {e}")
             return None
 
     
+    def stream_summary(provider, api_key, model, content, summary_type, language):
+        # Render the summary token by token under its heading; summaries are shared
+        # across sessions keyed on everything that shapes the answer
+        st.subheader("Summary:")
+        cache = response_cache.get_shared_cache("hw2_summaries")
+        key = summary_key(provider, model, content, summary_type, language)
+        summary = cache.get(key)
+        if summary is not None:
+            st.write(summary)
+            st.caption("Served from the summary cache")
+            return summary
+
+        if summarize.needs_map_reduce(content):
+            # Long page: summarize sections in parallel, then stream the combined summary
+            with st.spinner("Summarizing sections..."):
+                messages = summary_messages(provider, api_key, model, content, summary_type, language)
+        else:
+            messages = summary_messages(provider, api_key, model, content, summary_type, language)
+        summary = llm_stream.render_stream(
+            stream_summary_text(provider, api_key, model, messages),
+            label=f"hw2 {provider} summary",
+        ).strip()
+        llm_stream.timing_caption()
+        if summary:
+            cache.put(key, summary)
+        return summary
+
     def generate_summary_openai(content, summary_type, language, advanced):
-        import openai
-        openai.api_key = st.secrets["openai_api_key"]
-        model = "gpt-3.5-turbo" if advanced else "gpt-4"
-        prompt = f"Please provide a {summary_type.lower()} of the following content in {language}:\n\n{content}"
+        model = summary_model("openai", advanced)
         try:
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
-                temperature=0.7,
-            )
-            return response.choices[0].message.content.strip()
+            return stream_summary("openai", st.secrets["openai_api_key"], model, content, summary_type, language)
         except Exception as e:
             st.error(f"Error with OpenAI API: {e}")
             return None
 
     def generate_summary_anthropic(content, summary_type, language, advanced):
-        from anthropic import Anthropic
-        client = Anthropic(api_key=st.secrets["anthropic_api_key"])
-        model = "claude-2" if advanced else "claude-instant-1"
-        prompt = f"Human: Please provide a {summary_type.lower()} of the following content in {language}:\n\n{content}\n\nAssistant:"
+        model = summary_model("anthropic", advanced)
         try:
-            response = client.completions.create(
-                model=model,
-                prompt=prompt,
-                max_tokens_to_sample=300,
-            )
-            return response.completion.strip()
+            return stream_summary("anthropic", st.secrets["anthropic_api_key"], model, content, summary_type, language)
         except Exception as e:
             st.error(f"Error with Anthropic API: {e}")
             return None
 
     def generate_summary_cohere(content, summary_type, language, advanced):
-        import cohere
-        co = cohere.Client(st.secrets["cohere_api_key"])
-        model = "command"  if advanced else "Command-XLarge"
-        prompt = f"Please provide a {summary_type.lower()} of the following content in {language}:\n\n{content}"
+        model = summary_model("cohere", advanced)
         try:
-            response = co.generate(
-                model=model,
-                prompt=prompt,
-                max_tokens=300,
-                temperature=0.7,
-            )
-            return response.generations[0].text.strip()
+            return stream_summary("cohere", st.secrets["cohere_api_key"], model, content, summary_type, language)
         except Exception as e:
             st.error(f"Error with Cohere API: {e}")
             return None
 
     if url:
-        content = read_url_content(url)
-        if content:
-            st.write("Original Content (First 500 characters):")
-            st.write(content[:500] + "...")
-
-            summary = None
-
-            if llm == "OpenAI GPT-3.5":
-                summary = generate_summary_openai(content, summary_type, language, use_advanced_model)
-            elif llm == "Anthropic Claude":
-                summary = generate_summary_anthropic(content, summary_type, language, use_advanced_model)
-            elif llm == "Cohere Command":
-                summary = generate_summary_cohere(content, summary_type, language, use_advanced_model)
-
-            if summary:
-                st.subheader("Summary:")
-                st.write(summary)
-            else:
-                st.error("No summary was generated. Please check the API configuration or try again.")
+        with tracing.trace("hw2 summary"):
+            content = read_url_content(url)
+            if content:
+                st.write("Original Content (First 500 characters):")
+                st.write(content[:500] + "...")
+
+                summary = None
+
+                if llm == "OpenAI GPT-3.5":
+                    summary = generate_summary_openai(content, summary_type, language, use_advanced_model)
+                elif llm == "Anthropic Claude":
+                    summary = generate_summary_anthropic(content, summary_type, language, use_advanced_model)
+                elif llm == "Cohere Command":
+                    summary = generate_summary_cohere(content, summary_type, language, use_advanced_model)
+
+                if not summary:
+                    st.error("No summary was generated. Please check the API configuration or try again.")
 
 if __name__ == "__main__":
     run()
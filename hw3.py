@@ -1,94 +1,188 @@
 import streamlit as st
-from openai import OpenAI
-import google.generativeai as genai
-import requests
+import functools
 import toml
 import os
-from bs4 import BeautifulSoup
-
-# Load API keys from secrets.toml in .streamlit folder
-secrets_path = os.path.join(".streamlit", "secrets.toml")
-secrets = toml.load(secrets_path)
-
-# Configure Gemini
-genai.configure(api_key=secrets['gemini_api_key'])
-
-def fetch_url_content(url):
-    try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        return ' '.join(text.split())[:1000]
-    except Exception as e:
-        return f"Error fetching URL: {str(e)}"
+from conversation_memory import ConversationMemory
+import context_packer
+import html_extract
+import llm_clients
+import llm_stream
+import retrieval
+import tokens
+import tracing
+import url_fetch
+
+# Load API keys from secrets.toml in .streamlit folder, once per process on first use
+@st.cache_resource(show_spinner=False)
+def get_secrets():
+    secrets_path = os.path.join(".streamlit", "secrets.toml")
+    return toml.load(secrets_path)
+
+# Model behind each choice, for context window sizing
+MODELS = {
+    "OpenAI GPT-3.5": "gpt-3.5-turbo",
+    "OpenAI GPT-4": "gpt-4",
+    "Google Gemini": "gemini-pro",
+    "Cohere Command-R": "command",
+}
+PASSAGE_TOKENS = 200
+SYSTEM_PROMPT_TOKENS = 30
+
+def page_text(content):
+    return html_extract.extract_page_text(content)
+
+@functools.lru_cache(maxsize=32)
+def page_index(text):
+    return retrieval.BM25Index(tokens.chunk_text(text, PASSAGE_TOKENS, 20))
+
+def build_url_context(urls, query, budget):
+    # Fetch every configured URL concurrently (repeat questions are served from the
+    # cache), then pack the passages most relevant to the query into the budget
+    fetched = url_fetch.fetch_many([url for url in urls if url], page_text)
+    errors = ""
+    passages = []
+    with tracing.stage("retrieval", op="bm25+pack") as span:
+        for label, url in zip(("URL1", "URL2"), urls):
+            if url:
+                content = fetched[url]
+                if isinstance(content, Exception):
+                    errors += f"{label} content: Error fetching URL: {str(content)} "
+                    continue
+                index = page_index(content)
+                scores = index.scores(query)
+                passages += [
+                    {"text": chunk, "score": scores.get(i, 0.0), "source": f"{label} ({url})"}
+                    for i, chunk in enumerate(index.chunks)
+                ]
+        context = context_packer.format_context(context_packer.pack(passages, budget))
+        span["passages"] = len(passages)
+    return errors + context
+
+def context_budget(llm_model, question, memory_tokens):
+    reserved = memory_tokens + tokens.count_tokens(question) + SYSTEM_PROMPT_TOKENS
+    return context_packer.context_budget(MODELS[llm_model], reserved)
+
+def gemini_history(conversation_memory):
+    # Gemini wants alternating user/model turns that start with the user and
+    # end before the question being asked. It has no system turns, so a system
+    # message (the conversation summary) becomes an exchange of its own that
+    # the trailing question can never be merged into.
+    history = []
+    for message in conversation_memory:
+        if message['role'] == "system":
+            if history and history[-1]['role'] == "user":
+                history[-1]['parts'][0] += f"\n\n{message['content']}"
+            else:
+                history.append({"role": "user", "parts": [message['content']]})
+            history.append({"role": "model", "parts": ["Understood."]})
+            continue
+        role = "model" if message['role'] == "assistant" else "user"
+        if history and history[-1]['role'] == role:
+            history[-1]['parts'][0] += f"\n\n{message['content']}"
+        elif history or role == "user":
+            history.append({"role": role, "parts": [message['content']]})
+    if history and history[-1]['role'] == "user":
+        history.pop()
+    return history
+
+def get_gemini_chat(history):
+    # A persistent chat per Streamlit session. The history is reassigned every turn:
+    # that is local, and it also clears a response left broken by a failed stream.
+    if 'gemini_chat' not in st.session_state:
+        st.session_state['gemini_chat'] = llm_clients.get_gemini_model(get_secrets()['gemini_api_key'], 'gemini-pro').start_chat(history=history)
+    else:
+        st.session_state['gemini_chat'].history = history
+    st.session_state['gemini_history'] = history
+    return st.session_state['gemini_chat']
+
+def openai_messages(context, question, conversation_memory):
+    return [
+        {"role": "system", "content": f"You are a helpful assistant. Use the following context to answer questions: {context}"},
+        *conversation_memory,
+        {"role": "user", "content": question}
+    ]
 
 def generate_response(llm_model, context, question, conversation_memory):
     if llm_model.startswith("OpenAI"):
         model = "gpt-3.5-turbo" if llm_model == "OpenAI GPT-3.5" else "gpt-4"
-        client = OpenAI(api_key=secrets['openai_api_key'])
         try:
-            messages = [
-                {"role": "system", "content": f"You are a helpful assistant. Use the following context to answer questions: {context}"},
-                *conversation_memory,
-                {"role": "user", "content": question}
-            ]
-
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True
+            messages = openai_messages(context, question, conversation_memory)
+            return llm_stream.render_stream(
+                llm_stream.stream_text("openai", get_secrets()['openai_api_key'], model, messages),
+                label=f"hw3 {model}",
             )
 
-            message_placeholder = st.empty()
-            full_response = ""
-
-            for chunk in response:
-                full_response += chunk.choices[0].delta.content or ""
-                message_placeholder.markdown(full_response + "▌")
-            
-            message_placeholder.markdown(full_response)
-            return full_response
-
         except Exception as e:
             st.error(f"Error generating answer: {str(e)}")
             return None
 
     elif llm_model == "Google Gemini":
         try:
-            model = genai.GenerativeModel('gemini-pro')
-            chat = model.start_chat(history=[])
-            for message in conversation_memory:
-                chat.send_message(message['content'])
-            response = chat.send_message(f"{context}\n\n{question}")
-            return response.text
+            # One request per turn: the memory is handed over as chat history
+            chat = get_gemini_chat(gemini_history(conversation_memory))
+            answer = llm_stream.render_stream(
+                llm_stream.stream_gemini_chat(chat, f"{context}\n\n{question}"),
+                label="hw3 gemini-pro",
+            )
+            # Keep the plain question in history so page context is not replayed next turn
+            history = [*st.session_state['gemini_history'],
+                       {"role": "user", "parts": [question]},
+                       {"role": "model", "parts": [answer]}]
+            chat.history = history
+            st.session_state['gemini_history'] = history
+            return answer
         except Exception as e:
+            # Drop the failed or blocked exchange so the chat stays usable
+            if 'gemini_chat' in st.session_state:
+                st.session_state['gemini_chat'].history = st.session_state.get('gemini_history', [])
             st.error(f"Error generating answer: {str(e)}")
             return None
 
     elif llm_model == "Cohere Command-R":
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {secrets['cohere_api_key']}"
-        }
         conversation_history = "\n".join([f"{m['role']}: {m['content']}" for m in conversation_memory])
-        data = {
-            "prompt": f"{context}\n\n{conversation_history}\n\nHuman: {question}\n\nAssistant:",
-            "max_tokens": 2048,
-            "temperature": 0.5,
-            "p": 1,
-            "frequency_penalty": 0,
-            "presence_penalty": 0,
-            "model": "command"
-        }
-        response = requests.post("https://api.cohere.ai/v1/generate", headers=headers, json=data)
-        if response.status_code == 200:
-            return response.json()["generations"][0]["text"]
-        else:
-            st.error(f"Error generating answer: {response.text}")
+        prompt = f"{context}\n\n{conversation_history}\n\nHuman: {question}\n\nAssistant:"
+        try:
+            return llm_stream.render_stream(
+                llm_stream.stream_text(
+                    "cohere", get_secrets()['cohere_api_key'], "command",
+                    [{"role": "user", "content": prompt}],
+                    max_tokens=2048,
+                    temperature=0.5,
+                    p=1,
+                    frequency_penalty=0,
+                    presence_penalty=0,
+                ),
+                label="hw3 command",
+            )
+        except Exception as e:
+            st.error(f"Error generating answer: {str(e)}")
             return None
 
+# Provider and model used to maintain the rolling conversation summary
+SUMMARY_MODELS = {
+    "OpenAI GPT-3.5": ("openai", "openai_api_key", "gpt-3.5-turbo"),
+    "OpenAI GPT-4": ("openai", "openai_api_key", "gpt-3.5-turbo"),
+    "Google Gemini": ("gemini", "gemini_api_key", "gemini-pro"),
+    "Cohere Command-R": ("cohere", "cohere_api_key", "command"),
+}
+
+def select_conversation_memory(conversation_memory_type, llm_model):
+    memory = st.session_state.setdefault('conversation_memory', ConversationMemory())
+    memory.sync(st.session_state['messages'])
+    if conversation_memory_type == "Buffer of 5 questions":
+        conversation_memory = memory.question_window()
+    elif conversation_memory_type == "Conversation Summary":
+        provider, key_name, model = SUMMARY_MODELS[llm_model]
+        conversation_memory = memory.summary_window(
+            lambda prompt: llm_stream.complete_text(provider, get_secrets()[key_name], model,
+                                                    [{"role": "user", "content": prompt}], max_tokens=300)
+        )
+    else:  # Buffer of 5,000 tokens
+        conversation_memory = memory.token_window()
+    memory_tokens = memory.tokens(conversation_memory)
+    st.caption(f"Conversation memory: {len(conversation_memory)} messages, {memory_tokens} tokens")
+    return conversation_memory, memory_tokens
+
 def run():
     st.subheader("Dhruv's Question Answering Chatbot")
 
@@ -111,30 +205,16 @@ def run():
     if question:
         st.session_state['messages'].append({"role": "user", "content": question})
 
-        context = ""
-        if url1:
-            context += f"URL1 content: {fetch_url_content(url1)} "
-        if url2:
-            context += f"URL2 content: {fetch_url_content(url2)} "
-
-        # Implement conversation memory
-        if conversation_memory_type == "Buffer of 5 questions":
-            conversation_memory = st.session_state['messages'][-10:]  # Last 5 Q&A pairs
-        elif conversation_memory_type == "Conversation Summary":
-            conversation_memory = st.session_state['messages'][-1:]
-        else:  # Buffer of 5,000 tokens
-            conversation_memory = []
-            token_count = 0
-            for message in reversed(st.session_state['messages']):
-                token_count += len(message['content'].split())
-                if token_count > 5000:
-                    break
-                conversation_memory.insert(0, message)
-
-        response = generate_response(llm_model, context, question, conversation_memory)
-        if response:
+        with tracing.trace("hw3 answer"):
+            # Implement conversation memory
+            conversation_memory, memory_tokens = select_conversation_memory(conversation_memory_type, llm_model)
+
+            context = build_url_context([url1, url2], question, context_budget(llm_model, question, memory_tokens))
+
+            # The answer streams in right under its heading
             st.markdown("## Answer")
-            st.markdown(response)
+            response = generate_response(llm_model, context, question, conversation_memory)
+        if response:
             st.session_state['messages'].append({"role": "assistant", "content": response})
             st.session_state['waiting_for_more_info'] = True
 
@@ -145,30 +225,18 @@ def run():
                 follow_up_question = "Please provide more detailed information about the previous answer."
                 st.session_state['messages'].append({"role": "user", "content": follow_up_question})
                 
-                context = ""
-                if url1:
-                    context += f"URL1 content: {fetch_url_content(url1)} "
-                if url2:
-                    context += f"URL2 content: {fetch_url_content(url2)} "
-                
-                # Use the same conversation memory logic for follow-up questions
-                if conversation_memory_type == "Buffer of 5 questions":
-                    conversation_memory = st.session_state['messages'][-10:]
-                elif conversation_memory_type == "Conversation Summary":
-                    conversation_memory = st.session_state['messages'][-1:]
-                else:  # Buffer of 5,000 tokens
-                    conversation_memory = []
-                    token_count = 0
-                    for message in reversed(st.session_state['messages']):
-                        token_count += len(message['content'].split())
-                        if token_count > 5000:
-                            break
-                        conversation_memory.insert(0, message)
-                
-                response = generate_response(llm_model, context, follow_up_question, conversation_memory)
-                if response:
+                with tracing.trace("hw3 follow-up"):
+                    # Use the same conversation memory logic for follow-up questions
+                    conversation_memory, memory_tokens = select_conversation_memory(conversation_memory_type, llm_model)
+
+                    # Retrieve around the answer being expanded on, not the generic follow-up text
+                    previous_answer = st.session_state['messages'][-2]['content']
+                    context = build_url_context([url1, url2], f"{previous_answer} {follow_up_question}",
+                                                context_budget(llm_model, follow_up_question, memory_tokens))
+
                     st.markdown("## Additional Information")
-                    st.markdown(response)
+                    response = generate_response(llm_model, context, follow_up_question, conversation_memory)
+                if response:
                     st.session_state['messages'].append({"role": "assistant", "content": response})
             else:
                 st.write("What question do you want me to answer?")
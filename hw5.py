@@ -1,94 +1,221 @@
 import streamlit as st
-from openai import OpenAI
-__import__('pysqlite3')
 import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-import chromadb
-from chromadb.utils import embedding_functions
-import PyPDF2
-import os
-
-client = OpenAI(api_key=st.secrets["openai_api_key"])
+import context_packer
+import ingest
+import ingest_jobs
+import llm_stream
+import response_cache
+import tokens
+import tracing
+import vector_store
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+ANSWER_MODEL = "gpt-4"
+ANSWER_MAX_TOKENS = 150
+RETRIEVED_CHUNKS = 10
+JOB_POLL_SECONDS = 1.0
+SYSTEM_MESSAGE = "You are a helpful assistant that answers questions about courses based on the provided context. If the answer is not in the context, say you don't have that information."
+
+@st.cache_resource(show_spinner=False)
+def load_chromadb():
+    # Chroma needs a newer sqlite3 than some hosts ship; swap in pysqlite3 before
+    # the first chromadb import, which only happens once the page is used
+    __import__('pysqlite3')
+    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    import chromadb
+    return chromadb
+
+@st.cache_resource
+def get_embedding_function():
+    # One cache per process so repeat ingestion and repeat questions skip the API
+    load_chromadb()
+    from embedding_cache import CachedEmbeddingFunction
+    api_key = st.secrets["openai_api_key"]
+
+    def openai_embeddings(texts):
+        return llm_stream.embed_openai(api_key, EMBEDDING_MODEL, texts)
+
+    return CachedEmbeddingFunction(openai_embeddings, EMBEDDING_MODEL)
+
+def get_answer_cache():
+    # Shared by every session; near-duplicate questions match on question embeddings
+    # when they also retrieve the same context
+    return response_cache.get_shared_cache("hw5_answers", get_embedding_function())
+
+def answer_scope(collection_name):
+    # Answers only carry over between identical retrieval and prompt setups
+    return response_cache.make_key(collection_name, ANSWER_MODEL, SYSTEM_MESSAGE)
+
+@st.cache_resource
+def get_job_manager():
+    # One worker pool per process; ingestion runs off the script thread so the
+    # chat stays usable while large course packs are indexed
+    return ingest_jobs.JobManager()
+
+@st.cache_resource
+def get_store_manager():
+    # One Chroma client per process, shared by every session
+    return vector_store.StoreManager(load_chromadb(), path="./chroma_db")
+
+def current_namespace(course):
+    # Signed-in users get their own collections; everyone else shares per course
+    user = getattr(st, "user", None)
+    return ((user.get("email") if user is not None else None) or "shared", course or "default")
+
+def current_collection_name():
+    return vector_store.collection_name(*current_namespace(st.session_state.get('course')))
+
+def get_collection():
+    # Collection for the course picked in this session, touched on every use so
+    # the store manager sees it as active
+    namespace = current_namespace(st.session_state.get('course'))
+    return get_store_manager().collection(namespace, get_embedding_function())
+
+def query_passages(collection, query, embedding_function):
+    if not collection.count():
+        return []
+    # Embedded separately so embedding and search time show up as their own stages
+    with tracing.stage("embedding", texts=1):
+        query_embeddings = embedding_function([query])
+    with tracing.stage("chroma_query", results=RETRIEVED_CHUNKS):
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=RETRIEVED_CHUNKS,
+            include=["documents", "metadatas", "distances"]
+        )
+    return [
+        {"text": doc, "score": -distance, "source": f"document '{metadata['filename']}'"}
+        for doc, metadata, distance in zip(
+            results['documents'][0], results['metadatas'][0], results['distances'][0]
+        )
+    ]
+
+def relevant_context(passages, query):
+    # Best non-duplicate passages that fit the model's context budget
+    with tracing.stage("retrieval", op="pack", passages=len(passages)):
+        reserved = tokens.count_tokens(SYSTEM_MESSAGE) + tokens.count_tokens(query)
+        budget = context_packer.context_budget(ANSWER_MODEL, reserved, answer_tokens=ANSWER_MAX_TOKENS)
+        return context_packer.format_context(context_packer.pack(passages, budget))
+
+def answer_messages(context, query):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": f"Context: {context}\n\nQuestion: {query}"}
+    ]
 
 def run():
     st.subheader("Dhruv's Question Answering Chatbot")
 
     def create_chromadb_collection(pdf_files):
-        if 'HW4' not in st.session_state:
-            try:
-                chroma_client = chromadb.PersistentClient(path="./chroma_db")
-                openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                    api_key=st.secrets["openai_api_key"],
-                    model_name="text-embedding-ada-002"
-                )
-                st.session_state.HW4 = chroma_client.get_or_create_collection(
-                    name="HW4_collection",
-                    embedding_function=openai_ef
-                )
-                
-                for file in pdf_files:
-                    try:
-                        pdf_text = ""
-                        pdf_reader = PyPDF2.PdfReader(file)
-                        for page in pdf_reader.pages:
-                            pdf_text += page.extract_text()
-                        
-                        st.session_state.HW4.add(
-                            documents=[pdf_text],
-                            metadatas=[{"filename": file.name}],
-                            ids=[file.name]
-                        )
-                    except Exception as e:
-                        st.error(f"Error processing {file.name}: {e}")
-                
-                st.success("ChromaDB has been created and documents have been embedded!")
-            except Exception as e:
-                st.error(f"Error creating ChromaDB collection: {e}")
-
-    def get_relevant_context(query):
-        if 'HW4' in st.session_state:
-            try:
-                results = st.session_state.HW4.query(
-                    query_texts=[query],
-                    n_results=5,
-                    include=["documents", "metadatas"]
-                )
-                
-                context = ""
-                for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
-                    new_context = f"From document '{metadata['filename']}':\n{doc}\n\n"
-                    context += new_context
-                
-                return context
-            except Exception as e:
-                st.error(f"Error retrieving context: {e}")
-                return ""
-        return ""
-
-    def truncate_context(context, max_tokens=3000):
-        tokens = context.split()
-        if len(tokens) > max_tokens:
-            return " ".join(tokens[:max_tokens])
-        return context
+        # Queues an incremental ingestion job; progress shows up in show_ingest_jobs
+        try:
+            collection = get_collection()
+            embedding_function = get_embedding_function()
+            answer_cache = get_answer_cache()
+            manager = get_job_manager()
+            # Copy the uploads now, the widgets' buffers belong to this script run
+            files = [(file.name, file.getvalue()) for file in pdf_files]
+            traces = tracing.session_traces()
+
+            def ingest_job(job):
+                # Runs on a worker thread, so no Streamlit calls in here
+                with tracing.trace("hw5 ingest", store=traces):
+                    stats = ingest.ingest_pdfs(collection, embedding_function, files,
+                                               progress=job.update,
+                                               lock=manager.collection_lock(collection.name),
+                                               write_lock=manager.write_lock)
+                if stats.chunks_added or stats.chunks_deleted:
+                    answer_cache.invalidate(answer_scope(collection.name))
+                return stats
+
+            job = manager.submit(f"{len(files)} file(s): " + ", ".join(name for name, _ in files), ingest_job)
+            st.session_state.setdefault('ingest_jobs', []).append(job.id)
+        except ingest_jobs.QueueFull as e:
+            st.error(f"Ingestion queue is full: {e}")
+        except Exception as e:
+            st.error(f"Error creating ChromaDB collection: {e}")
+
+    def show_ingest_jobs():
+        manager = get_job_manager()
+        for job_id in st.session_state.get('ingest_jobs', []):
+            job = manager.get(job_id)
+            if job is None:
+                continue
+            st.markdown(f"**Ingestion #{job.id}** — {job.label}")
+            if job.active:
+                st.progress(job.progress, text=job.message)
+                if not job.cancelled and st.button("Cancel", key=f"cancel_ingest_{job.id}"):
+                    job.cancel()
+            elif job.status == "done":
+                stats = job.result
+                for name, error in stats.errors.items():
+                    st.error(f"Error processing {name}: {error}")
+                st.caption(stats.summary())
+                cache_stats = get_embedding_function().stats()
+                st.caption(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+                st.success("ChromaDB is up to date with your documents!")
+            elif job.status == "failed":
+                st.error(f"Error creating ChromaDB collection: {job.error}")
+            else:
+                st.info("Ingestion cancelled")
+
+    def get_relevant_passages(query):
+        try:
+            return query_passages(get_collection(), query, get_embedding_function())
+        except Exception as e:
+            st.error(f"Error retrieving context: {e}")
+            return []
 
     def generate_response(messages):
+        # Streams the answer into the current container; None when generation failed
         try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=150
+            response = llm_stream.render_stream(
+                llm_stream.stream_text("openai", st.secrets["openai_api_key"], ANSWER_MODEL, messages, max_tokens=ANSWER_MAX_TOKENS),
+                label="hw5 answer",
             )
-            return response.choices[0].message.content
+            llm_stream.timing_caption()
+            return response
         except Exception as e:
-            return f"Error generating response: {str(e)}"
+            st.markdown(f"Error generating response: {str(e)}")
+            return None
 
     st.title("Understanding your courses!")
 
+    st.text_input("Course", value="default", key="course",
+                  help="Each course keeps its own document collection")
+
+    store_stats = get_store_manager().stats()
+    budget = (f"index cache budget {store_stats['budget_mb']:.0f} MB"
+              if store_stats['budget_mb'] is not None else "no index memory budget with this chromadb")
+    st.sidebar.caption(
+        f"Vector store: {store_stats['collections_open']} collections open, "
+        f"{store_stats['vectors']} vectors, RSS {store_stats['rss_mb']:.0f} MB ({budget})"
+    )
+
     pdf_files = st.file_uploader("Upload your PDF files", accept_multiple_files=True, type=["pdf"])
 
     if st.button("Create/Update ChromaDB") and pdf_files:
         create_chromadb_collection(pdf_files)
 
+    def jobs_active():
+        return any(job is not None and job.active
+                   for job in map(get_job_manager().get, st.session_state.get('ingest_jobs', [])))
+
+    def poll_ingest_jobs():
+        show_ingest_jobs()
+        # The last job finished: rerun the page once so polling stops
+        if not jobs_active():
+            st.rerun()
+
+    # Poll job status in a fragment so only this block reruns while indexing
+    active = jobs_active()
+    if active and hasattr(st, "fragment"):
+        st.fragment(run_every=JOB_POLL_SECONDS)(poll_ingest_jobs)()
+    else:
+        show_ingest_jobs()
+        if active and st.button("Refresh status"):
+            st.rerun()
+
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
@@ -100,21 +227,28 @@ def run():
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
 
-        context = get_relevant_context(prompt)
-        truncated_context = truncate_context(context)
-
-        system_message = "You are a helpful assistant that answers questions about courses based on the provided context. If the answer is not in the context, say you don't have that information."
-        user_message = f"Context: {truncated_context}\n\nQuestion: {prompt}"
-
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
-        ]
-
-        response = generate_response(messages)
-
-        with st.chat_message("assistant"):
-            st.markdown(response)
+        cache = get_answer_cache()
+        scope = answer_scope(current_collection_name())
+        key = response_cache.make_key(scope, response_cache.normalize_question(prompt))
+
+        with st.chat_message("assistant"), tracing.trace("hw5 answer"):
+            with tracing.stage("retrieval", op="answer_cache") as span:
+                response = cache.get(key)
+                span["hit"] = response is not None
+            if response is None:
+                context = relevant_context(get_relevant_passages(prompt), prompt)
+                with tracing.stage("retrieval", op="answer_cache_similar") as span:
+                    response = cache.get_similar(prompt, scope, context)
+                    span["hit"] = response is not None
+            if response is not None:
+                st.markdown(response)
+                st.caption("Served from the answer cache")
+            else:
+                response = generate_response(answer_messages(context, prompt))
+                if response:
+                    cache.put(key, response, scope=scope, query=prompt, context=context)
+                else:
+                    response = "Error generating response."
         st.session_state.messages.append({"role": "assistant", "content": response})
 
 if __name__ == "__main__":
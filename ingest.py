@@ -0,0 +1,288 @@
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_text
+import tokens
+import tracing
+
+# Pipeline sizing
+PAGES_PER_TASK = 8
+EXTRACT_WORKERS = None  # processes; None uses every CPU
+CHUNK_TOKENS = 500
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = 100
+EMBED_CONCURRENCY = 4
+
+
+class IngestStats:
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.embeddings = 0
+        self.files_skipped = 0
+        self.chunks_added = 0
+        self.chunks_unchanged = 0
+        self.chunks_deleted = 0
+        self.errors = {}
+        self.seconds = {"diff": 0.0, "extract": 0.0, "chunk": 0.0, "embed": 0.0, "store": 0.0}
+
+    def rate(self, count, stage):
+        elapsed = self.seconds[stage]
+        return count / elapsed if elapsed > 0 else 0.0
+
+    def throughput(self):
+        return {
+            "pages/s": self.rate(self.pages, "extract"),
+            "chunks/s": self.rate(self.chunks, "chunk"),
+            "embeddings/s": self.rate(self.embeddings, "embed"),
+        }
+
+    def summary(self):
+        rates = self.throughput()
+        return (
+            f"{self.files} files ({self.files_skipped} unchanged), {self.pages} pages, "
+            f"{self.chunks} chunks (+{self.chunks_added} / -{self.chunks_deleted}) in "
+            f"{sum(self.seconds.values()):.2f}s — "
+            f"{rates['pages/s']:.1f} pages/s, {rates['chunks/s']:.1f} chunks/s, "
+            f"{rates['embeddings/s']:.1f} embeddings/s"
+        )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    # One extraction pool per process, kept between ingestions. Workers start
+    # fresh (forkserver, or spawn where unavailable) instead of being forked from
+    # the multithreaded Streamlit process; they import __main__ without running it.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=context)
+        return _pool
+
+
+def _discard_process_pool(pool):
+    # A worker died; the next ingestion starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pages(files, pages_per_task=PAGES_PER_TASK):
+    # files is a list of (name, pdf_bytes); returns ({name: [page_text, ...]}, {name: error}).
+    # Files seen before come straight from the extraction cache. Each new file is
+    # written to a temp file once and workers open it by path.
+    pages, errors, pending = {}, {}, []
+    for name, data in files:
+        cached = pdf_text.load_cached(pdf_text.digest(data))
+        if cached is not None:
+            pages[name] = list(cached)
+        else:
+            pending.append((name, data))
+    if not pending:
+        return pages, errors
+
+    pool = get_process_pool()
+    try:
+        with tempfile.TemporaryDirectory(prefix="ingest_") as workdir:
+            paths = {}
+            for i, (name, data) in enumerate(pending):
+                paths[name] = os.path.join(workdir, f"{i}.pdf")
+                with open(paths[name], "wb") as f:
+                    f.write(data)
+            counts = [(name, pool.submit(pdf_text.page_count, paths[name])) for name, _ in pending]
+            futures = []
+            for name, count in counts:
+                try:
+                    num_pages = count.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                pages[name] = []
+                for start in range(0, num_pages, pages_per_task):
+                    end = min(start + pages_per_task, num_pages)
+                    futures.append((name, pool.submit(pdf_text.extract_page_range, paths[name], start, end)))
+            for name, future in futures:
+                try:
+                    pages[name].extend(future.result())
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    errors[name] = e
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+    for name in errors:
+        pages.pop(name, None)
+    for name, data in pending:
+        if name in pages:
+            pdf_text.store_cached(pdf_text.digest(data), pages[name])
+    return pages, errors
+
+
+def embed_in_batches(embedding_function, texts, batch_size=EMBED_BATCH_SIZE,
+                     max_concurrency=EMBED_CONCURRENCY, progress=None):
+    # progress(done, total) is called after every batch, in order
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    embeddings = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for batch_embeddings in pool.map(embedding_function, batches):
+            embeddings.extend(batch_embeddings)
+            if progress:
+                progress(len(embeddings), len(texts))
+    return embeddings
+
+
+def page_chunks(pages, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    # (page_number, chunk) pairs. Chunk boundaries never cross a page, so editing
+    # one page leaves the chunks of every other page unchanged.
+    for page, text in enumerate(pages, start=1):
+        if text.strip():
+            for chunk in tokens.chunk_text(text, chunk_tokens, overlap):
+                yield page, chunk
+
+
+def digest(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def indexed_chunks(collection, filename):
+    # {chunk_id: metadata} for everything currently stored for one file
+    existing = collection.get(where={"filename": filename}, include=["metadatas"])
+    return dict(zip(existing["ids"], existing["metadatas"]))
+
+
+def ingest_pdfs(collection, embedding_function, files, progress=None, lock=None, write_lock=None):
+    # Diff -> extract -> chunk -> embed -> store, timing every stage. Pages are
+    # chunked one by one and chunk ids come from the chunk's content (plus its
+    # occurrence, for repeated text), so an edit only re-embeds the chunks of the
+    # pages it touched, and chunks that merely moved to another page (a page
+    # inserted or removed before them) only get their metadata updated.
+    # progress(fraction, text) may raise to abort between stages. lock, shared by
+    # every ingestion into the collection, is held from the diff through the
+    # store so no ingestion writes against a snapshot another one has changed.
+    # write_lock, shared by every ingestion into the store, serializes the
+    # store stage so a single writer talks to Chroma's database at a time.
+    if lock is None:
+        return _ingest_pdfs(collection, embedding_function, files, progress, write_lock)
+    if not lock.acquire(blocking=False):
+        if progress:
+            progress(0.0, "Waiting for another ingestion into this collection")
+        lock.acquire()
+    try:
+        return _ingest_pdfs(collection, embedding_function, files, progress, write_lock)
+    finally:
+        lock.release()
+
+
+def _ingest_pdfs(collection, embedding_function, files, progress, write_lock):
+    stats = IngestStats()
+    stats.files = len(files)
+
+    started = time.perf_counter()
+    existing, changed = {}, []
+    for name, data in files:
+        file_digest = digest(data)
+        existing[name] = indexed_chunks(collection, name)
+        stored = existing[name].values()
+        if stored and all(meta.get("file_digest") == file_digest for meta in stored):
+            stats.files_skipped += 1
+        else:
+            changed.append((name, data, file_digest))
+    stats.seconds["diff"] = time.perf_counter() - started
+    tracing.record("chroma_query", stats.seconds["diff"], op="diff", files=len(files))
+    if progress:
+        progress(0.1, f"{len(changed)} of {len(files)} files changed")
+
+    started = time.perf_counter()
+    pages, stats.errors = extract_pages([(name, data) for name, data, _ in changed]) if changed else ({}, {})
+    stats.seconds["extract"] = time.perf_counter() - started
+    stats.pages = sum(len(p) for p in pages.values())
+    tracing.record("pdf_extract", stats.seconds["extract"], pages=stats.pages)
+    if progress:
+        progress(0.3, f"Extracted {stats.pages} pages")
+
+    started = time.perf_counter()
+    ids, documents, metadatas = [], [], []
+    updated_ids, updated_metadatas, stale_ids = [], [], []
+    for name, _, file_digest in changed:
+        if name not in pages:
+            continue
+        current, occurrences = {}, Counter()
+        for page, chunk in page_chunks(pages[name]):
+            chunk_digest = digest(chunk)
+            occurrences[chunk_digest] += 1
+            chunk_id = f"{name}:{chunk_digest[:32]}:{occurrences[chunk_digest]}"
+            current[chunk_id] = chunk
+            metadata = {"filename": name, "page": page, "chunk": len(current) - 1,
+                        "file_digest": file_digest, "chunk_digest": chunk_digest}
+            if chunk_id in existing[name]:
+                updated_ids.append(chunk_id)
+                updated_metadatas.append(metadata)
+            else:
+                ids.append(chunk_id)
+                documents.append(chunk)
+                metadatas.append(metadata)
+        stale_ids.extend(chunk_id for chunk_id in existing[name] if chunk_id not in current)
+        stats.chunks += len(current)
+    stats.seconds["chunk"] = time.perf_counter() - started
+    stats.chunks_added = len(ids)
+    stats.chunks_unchanged = len(updated_ids)
+    stats.chunks_deleted = len(stale_ids)
+    tracing.record("chunk", stats.seconds["chunk"], chunks=stats.chunks)
+    if progress:
+        progress(0.5, f"Split into {stats.chunks} chunks, {stats.chunks_added} new")
+
+    started = time.perf_counter()
+    def embed_progress(done, total):
+        if progress:
+            progress(0.5 + 0.4 * done / total, f"Embedded {done} of {total} chunks")
+
+    embeddings = embed_in_batches(embedding_function, documents, progress=embed_progress) if documents else []
+    stats.seconds["embed"] = time.perf_counter() - started
+    stats.embeddings = len(embeddings)
+    tracing.record("embedding", stats.seconds["embed"], texts=stats.embeddings)
+    if progress:
+        progress(0.9, f"Computed {stats.embeddings} embeddings")
+
+    started = time.perf_counter()
+    with write_lock or contextlib.nullcontext():
+        for i in range(0, len(ids), EMBED_BATCH_SIZE):
+            collection.upsert(
+                ids=ids[i:i + EMBED_BATCH_SIZE],
+                documents=documents[i:i + EMBED_BATCH_SIZE],
+                embeddings=embeddings[i:i + EMBED_BATCH_SIZE],
+                metadatas=metadatas[i:i + EMBED_BATCH_SIZE],
+            )
+        # Unchanged chunks only need their position and file digest refreshed
+        for i in range(0, len(updated_ids), EMBED_BATCH_SIZE):
+            collection.update(
+                ids=updated_ids[i:i + EMBED_BATCH_SIZE],
+                metadatas=updated_metadatas[i:i + EMBED_BATCH_SIZE],
+            )
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+    stats.seconds["store"] = time.perf_counter() - started
+    tracing.record("chroma_write", stats.seconds["store"], added=stats.chunks_added, deleted=stats.chunks_deleted)
+    if progress:
+        progress(1.0, "Stored chunks in ChromaDB")
+    return stats
@@ -0,0 +1,120 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+WORKERS = 2
+MAX_QUEUED = 8
+JOBS_KEPT = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, label, fn):
+        self.id = job_id
+        self.label = label
+        self.fn = fn
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Waiting for a worker..."
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+            self.message = "Cancelled"
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def update(self, progress, message):
+        # Progress callback for the job function; also the cancellation checkpoint
+        if self.cancelled:
+            raise JobCancelled()
+        self.progress = progress
+        self.message = message
+
+
+class JobManager:
+    # Fixed worker pool over a bounded queue. Jobs share write_lock so only one
+    # of them writes to the vector store at a time, and jobs for the same
+    # collection take turns through collection_lock from diff to store.
+    def __init__(self, workers=WORKERS, max_queued=MAX_QUEUED):
+        self.write_lock = threading.Lock()
+        self._collection_locks = {}
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True).start()
+
+    def submit(self, label, fn):
+        # fn(job) runs on a worker thread and reports through job.update()
+        with self._lock:
+            job = Job(next(self._ids), label, fn)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self._queue.maxsize} jobs are already waiting, try again shortly")
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOBS_KEPT:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.active:
+                    break
+                self._jobs.popitem(last=False)
+        return job
+
+    def collection_lock(self, name):
+        with self._lock:
+            return self._collection_locks.setdefault(name, threading.Lock())
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancelled:
+                    continue
+                job.status = "running"
+                job.started = time.time()
+                job.result = job.fn(job)
+                job.status = "done"
+                job.progress = 1.0
+                job.message = "Finished"
+            except JobCancelled:
+                job.status = "cancelled"
+                job.message = "Cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = e
+                job.message = f"Failed: {e}"
+            finally:
+                job.finished = time.time()
+                job.fn = None
+                self._queue.task_done()
@@ -0,0 +1,31 @@
+import streamlit as st
+
+# One client per (provider, key) for the whole process. The SDK clients keep
+# their HTTP connection pools alive, so reusing them skips client construction
+# and TLS setup on every request. SDK retries are off: scheduler.Scheduler
+# already retries with backoff, and the two would multiply.
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key, base_url=None):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+@st.cache_resource(show_spinner=False)
+def get_anthropic_client(api_key):
+    from anthropic import Anthropic
+    return Anthropic(api_key=api_key, max_retries=0)
+
+
+@st.cache_resource(show_spinner=False)
+def get_cohere_client(api_key):
+    import cohere
+    return cohere.Client(api_key)
+
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_model(api_key, model_name):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
@@ -0,0 +1,173 @@
+import time
+
+import streamlit as st
+
+import llm_clients
+import response_cache
+import tracing
+from scheduler import scheduler
+from tokens import count_tokens
+
+RENDER_INTERVAL = 0.05  # seconds between placeholder refreshes
+TIMINGS_KEPT = 50
+TOKENS_PER_MESSAGE = 3
+
+# Every provider is exposed as a generator of text deltas over the same
+# chat-style messages: [{"role": "system" | "user" | "assistant", "content": ...}]
+
+
+def stream_openai(api_key, model, messages, max_tokens=None, temperature=None, base_url=None):
+    client = llm_clients.get_openai_client(api_key, base_url)
+    options = {}
+    if max_tokens is not None:
+        options["max_tokens"] = max_tokens
+    if temperature is not None:
+        options["temperature"] = temperature
+    response = client.chat.completions.create(model=model, messages=messages, stream=True, **options)
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_anthropic(api_key, model, messages, max_tokens=1024, temperature=None):
+    client = llm_clients.get_anthropic_client(api_key)
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    options = {"system": system} if system else {}
+    if temperature is not None:
+        options["temperature"] = temperature
+    chat = [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"]
+    with client.messages.stream(model=model, max_tokens=max_tokens, messages=chat, **options) as stream:
+        yield from stream.text_stream
+
+
+def stream_cohere(api_key, model, messages, max_tokens=None, temperature=None, **options):
+    # Cohere's generate endpoint takes one prompt; earlier turns are flattened into it
+    co = llm_clients.get_cohere_client(api_key)
+    if len(messages) == 1:
+        prompt = messages[0]["content"]
+    else:
+        prompt = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages) + "\n\nassistant:"
+    if max_tokens is not None:
+        options["max_tokens"] = max_tokens
+    if temperature is not None:
+        options["temperature"] = temperature
+    for event in co.generate_stream(model=model, prompt=prompt, **options):
+        if event.event_type == "text-generation":
+            yield event.text
+        elif event.event_type == "stream-error":
+            raise RuntimeError(getattr(event, "err", "Cohere stream error"))
+
+
+def stream_gemini(api_key, model, messages, max_tokens=None, temperature=None):
+    config = {}
+    if max_tokens is not None:
+        config["max_output_tokens"] = max_tokens
+    if temperature is not None:
+        config["temperature"] = temperature
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    contents = [
+        {"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+        for m in messages if m["role"] != "system"
+    ]
+    if system and contents:
+        contents[0]["parts"] = [f"{system}\n\n{contents[0]['parts'][0]}"]
+    response = llm_clients.get_gemini_model(api_key, model).generate_content(
+        contents, generation_config=config or None, stream=True
+    )
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+def _stream_gemini_chat(chat, message):
+    for chunk in chat.send_message(message, stream=True):
+        if chunk.text:
+            yield chunk.text
+
+
+def _traced(chunks, provider, model, messages):
+    if tracing.current() is None:
+        return chunks
+    tokens_in = sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages)
+    return tracing.traced_stream(chunks, count_tokens=count_tokens, provider=provider, model=model,
+                                 tokens_in=tokens_in)
+
+
+def stream_gemini_chat(chat, message):
+    # For an existing Gemini chat session; the chat records the reply once the
+    # stream ends. Rate limited like everything else, but never coalesced.
+    chunks = scheduler.stream("gemini", None, lambda: _stream_gemini_chat(chat, message))
+    model = getattr(getattr(chat, "model", None), "model_name", "gemini")
+    return _traced(chunks, "gemini", model, [{"content": message}])
+
+
+PROVIDERS = {
+    "openai": stream_openai,
+    "anthropic": stream_anthropic,
+    "cohere": stream_cohere,
+    "gemini": stream_gemini,
+}
+
+
+def stream_text(provider, api_key, model, messages, **options):
+    # Scheduled per provider; an identical request already in flight is joined
+    # instead of being sent again
+    key = response_cache.make_key(provider, api_key, model, messages, options)
+    chunks = scheduler.stream(provider, key, lambda: PROVIDERS[provider](api_key, model, messages, **options))
+    return _traced(chunks, provider, model, messages)
+
+
+def complete_text(provider, api_key, model, messages, **options):
+    return "".join(stream_text(provider, api_key, model, messages, **options))
+
+
+def embed_openai(api_key, model, texts, base_url=None):
+    # The SDK client does not retry (see llm_clients); the scheduler does
+    client = llm_clients.get_openai_client(api_key, base_url)
+
+    def create():
+        response = client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+    return scheduler.call("openai_embeddings", create)
+
+
+def render_stream(chunks, placeholder=None, label=None):
+    # Renders deltas into a placeholder as they arrive and records time to first token
+    placeholder = placeholder or st.empty()
+    parts = []
+    started = time.perf_counter()
+    first_token = None
+    last_render = 0.0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        now = time.perf_counter()
+        if first_token is None:
+            first_token = now - started
+        parts.append(chunk)
+        if now - last_render >= RENDER_INTERVAL:
+            placeholder.markdown("".join(parts) + "▌")
+            last_render = now
+    text = "".join(parts)
+    placeholder.markdown(text)
+
+    timings = st.session_state.setdefault('llm_timings', [])
+    timings.append({
+        "label": label,
+        "ttft": first_token,
+        "total": time.perf_counter() - started,
+        "chars": len(text),
+    })
+    del timings[:-TIMINGS_KEPT]
+    return text
+
+
+def last_timing():
+    timings = st.session_state.get('llm_timings')
+    return timings[-1] if timings else None
+
+
+def timing_caption():
+    timing = last_timing()
+    if timing and timing["ttft"] is not None:
+        st.caption(f"First token after {timing['ttft']:.2f}s, complete after {timing['total']:.2f}s")
@@ -0,0 +1,204 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import PyPDF2
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF before 1.24
+    except ImportError:
+        fitz = None
+
+CACHE_DIR = ".pdf_text_cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+# Backends open a PDF from bytes or a file path and expose page_count / page_text(i)
+class PyMuPDFBackend:
+    name = "pymupdf"
+
+    def __init__(self, pdf):
+        if isinstance(pdf, str):
+            self.doc = fitz.open(pdf, filetype="pdf")
+        else:
+            self.doc = fitz.open(stream=pdf, filetype="pdf")
+
+    def page_count(self):
+        return self.doc.page_count
+
+    def page_text(self, i):
+        return self.doc.load_page(i).get_text()
+
+    def close(self):
+        self.doc.close()
+
+
+class PyPDF2Backend:
+    name = "pypdf2"
+
+    def __init__(self, pdf):
+        self.reader = PyPDF2.PdfReader(pdf if isinstance(pdf, str) else io.BytesIO(pdf))
+
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def page_text(self, i):
+        return self.reader.pages[i].extract_text() or ""
+
+    def close(self):
+        pass
+
+
+BACKENDS = {"pypdf2": PyPDF2Backend}
+if fitz is not None:
+    BACKENDS["pymupdf"] = PyMuPDFBackend
+DEFAULT_BACKEND = "pymupdf" if fitz is not None else "pypdf2"
+
+
+def open_pdf(pdf, backend=DEFAULT_BACKEND):
+    # pdf: the document's bytes or a path to it
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend {backend!r}, choose from {sorted(BACKENDS)}")
+    return BACKENDS[backend](pdf)
+
+
+def page_count(pdf, backend=DEFAULT_BACKEND):
+    pdf = open_pdf(pdf, backend)
+    try:
+        return pdf.page_count()
+    finally:
+        pdf.close()
+
+
+def iter_pages(pdf, backend=DEFAULT_BACKEND, start=0, end=None):
+    # Yields one page of text at a time so callers never hold the whole document
+    pdf = open_pdf(pdf, backend)
+    try:
+        stop = pdf.page_count() if end is None else min(end, pdf.page_count())
+        for i in range(start, stop):
+            yield pdf.page_text(i)
+    finally:
+        pdf.close()
+
+
+def extract_page_range(path, start, end):
+    # Process pool task: takes a path, so the document is not pickled per task
+    return list(iter_pages(path, start=start, end=end))
+
+
+def digest(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+# Extraction cache: one JSON-lines file of page texts per (backend, byte digest)
+def _cache_path(file_digest, backend):
+    return os.path.join(CACHE_DIR, backend, f"{file_digest}.jsonl")
+
+
+def load_cached(file_digest, backend=DEFAULT_BACKEND):
+    # Streams cached pages, or returns None on a miss
+    path = _cache_path(file_digest, backend)
+    if not os.path.exists(path):
+        return None
+    os.utime(path)
+
+    def pages():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    return pages()
+
+
+class _CacheWriter:
+    def __init__(self, file_digest, backend):
+        self.path = _cache_path(file_digest, backend)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # A temp file per writer: threads of one process may fill the same entry at once
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        self.file = os.fdopen(fd, "w", encoding="utf-8")
+
+    def write(self, page):
+        self.file.write(json.dumps(page) + "\n")
+
+    def commit(self):
+        self.file.close()
+        try:
+            os.replace(self.tmp_path, self.path)
+        except OSError:
+            # Lost a race to a writer of the same entry (e.g. the target is open on
+            # Windows): its copy holds the same pages, so keep that one
+            self._discard()
+            if not os.path.exists(self.path):
+                raise
+        prune_cache()
+
+    def abort(self):
+        self.file.close()
+        self._discard()
+
+    def _discard(self):
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def store_cached(file_digest, pages, backend=DEFAULT_BACKEND):
+    writer = _CacheWriter(file_digest, backend)
+    try:
+        for page in pages:
+            writer.write(page)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+
+def iter_pages_cached(pdf_bytes, backend=DEFAULT_BACKEND):
+    # Cached page stream for an upload; a miss extracts and fills the cache as it goes
+    file_digest = digest(pdf_bytes)
+    cached = load_cached(file_digest, backend)
+    if cached is not None:
+        yield from cached
+        return
+    writer = _CacheWriter(file_digest, backend)
+    try:
+        for page in iter_pages(pdf_bytes, backend):
+            writer.write(page)
+            yield page
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+
+def extract_text(pdf_bytes, backend=DEFAULT_BACKEND, separator="\n"):
+    return separator.join(iter_pages_cached(pdf_bytes, backend))
+
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES):
+    # Drop least recently used cache files once the cache outgrows its budget
+    entries = []
+    for root, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            if name.endswith(".jsonl"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # pruned by another thread meanwhile
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
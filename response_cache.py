@@ -0,0 +1,130 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+TTL = 24 * 60 * 60
+MAX_ENTRIES = 1_000
+SIMILARITY_THRESHOLD = 0.98
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def content_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class _Entry:
+    def __init__(self, text, scope, vector, context):
+        self.text = text
+        self.scope = scope
+        self.vector = vector
+        self.context = context  # digest of the context the answer was generated from
+        self.created = time.time()
+
+
+class ResponseCache:
+    # Exact-match LLM response cache with TTL and LRU eviction. When an embedding
+    # function is given, get_similar can also serve the answer to a near-identical
+    # earlier query, but only one generated from the very same context: similar
+    # questions ("HW3 due?" / "HW4 due?") usually retrieve different passages.
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES, embedding_function=None,
+                 similarity_threshold=SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.created > self.ttl:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        # Exact lookup; misses counts these only
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.text
+            self.misses += 1
+        return None
+
+    def _embed(self, query):
+        return _unit(self.embedding_function([query])[0])
+
+    def get_similar(self, query, scope, context):
+        # Most similar earlier query in scope that was answered from this exact context
+        if self.embedding_function is None:
+            return None
+        vector = self._embed(query)
+        context = content_digest(context)
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key in list(self._entries):
+                entry = self._live(key)
+                if entry is None or entry.vector is None or entry.scope != scope or entry.context != context:
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry.vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._entries[best_key].text
+
+    def put(self, key, text, scope=None, query=None, context=None):
+        # query and context make the entry eligible for get_similar
+        vector = None
+        if self.embedding_function is not None and query is not None and context is not None:
+            vector = self._embed(query)
+            context = content_digest(context)
+        with self._lock:
+            self._entries[key] = _Entry(text, scope, vector, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, scope):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.scope == scope]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_cache(name, _embedding_function=None, ttl=TTL, max_entries=MAX_ENTRIES):
+    # One cache per name for the whole process, shared by every session
+    return ResponseCache(ttl, max_entries, _embedding_function)
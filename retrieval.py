@@ -0,0 +1,61 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+import tokens
+
+CHUNK_TOKENS = 300
+CHUNK_OVERLAP = 50
+TOP_K = 5
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD_RE.findall(text.lower())
+
+
+class BM25Index:
+    # Okapi BM25 over a fixed list of chunks, scored through an inverted index
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for i, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings[term].append((i, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    def scores(self, query):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, k=TOP_K):
+        # [(score, chunk_index)] for the k best chunks, best first
+        return heapq.nlargest(k, ((score, i) for i, score in self.scores(query).items()))
+
+    def top_chunks(self, query, k=TOP_K):
+        # Best k chunks in document order; falls back to the opening chunks
+        hits = sorted(i for _, i in self.search(query, k)) or list(range(min(k, len(self.chunks))))
+        return [self.chunks[i] for i in hits]
+
+
+def build_index(text, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    return BM25Index(tokens.chunk_text(text, chunk_tokens, overlap))
@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+
+# Per-provider limits: sustained requests per minute, burst size and concurrent streams.
+# Sized for the classroom keys; raise them for higher API tiers.
+PROVIDER_LIMITS = {
+    "openai": {"rpm": 500, "burst": 20, "concurrency": 8},
+    # Embeddings have their own limits upstream; a separate bucket also keeps
+    # ingestion batches from taking every chat slot
+    "openai_embeddings": {"rpm": 500, "burst": 20, "concurrency": 8},
+    "anthropic": {"rpm": 50, "burst": 5, "concurrency": 4},
+    "cohere": {"rpm": 100, "burst": 10, "concurrency": 4},
+    "gemini": {"rpm": 60, "burst": 5, "concurrency": 4},
+}
+DEFAULT_LIMITS = {"rpm": 60, "burst": 5, "concurrency": 4}
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 30.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# SDK exception names that carry no status code but are worth retrying
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TooManyRequestsError",
+    "ConnectionError", "Timeout",
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a request may start; returns the seconds spent waiting
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        # The provider pushed back (429 / Retry-After): hold every caller, not just this one
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def status_code(error):
+    code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    # Full jitter: spreads retries of a burst instead of re-synchronizing them
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class _Flight:
+    # One upstream request; any number of readers replay its chunks as they arrive
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def read(self):
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                new = self.chunks[seen:]
+                finished = self.done and seen + len(new) == len(self.chunks)
+            seen += len(new)
+            yield from new
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class Scheduler:
+    # Every LLM request goes through here: the provider's token bucket and
+    # concurrency cap gate the start, retryable failures back off with jitter
+    # (only before the first chunk, so streamed text is never duplicated), and
+    # identical requests already in flight share one upstream call.
+    def __init__(self, limits=PROVIDER_LIMITS, max_attempts=MAX_ATTEMPTS):
+        self.limits = limits
+        self.max_attempts = max_attempts
+        self.counters = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0, "throttled_seconds": 0.0}
+        self._buckets = {}
+        self._slots = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _provider(self, provider):
+        with self._lock:
+            if provider not in self._buckets:
+                limits = self.limits.get(provider, DEFAULT_LIMITS)
+                self._buckets[provider] = TokenBucket(limits["rpm"] / 60, limits["burst"])
+                self._slots[provider] = threading.BoundedSemaphore(limits["concurrency"])
+            return self._buckets[provider], self._slots[provider]
+
+    def stream(self, provider, key, factory):
+        # factory() starts the request and returns an iterator of text chunks.
+        # key identifies identical requests; None disables coalescing.
+        with self._lock:
+            flight = self._flights.get(key) if key is not None else None
+            if flight is not None:
+                self.counters["coalesced"] += 1
+            else:
+                flight = _Flight()
+                if key is not None:
+                    self._flights[key] = flight
+                self.counters["requests"] += 1
+                threading.Thread(target=self._drive, args=(provider, key, factory, flight), daemon=True).start()
+        return flight.read()
+
+    def call(self, provider, fn):
+        # Non-streaming request (embeddings): fn() is gated and retried like a
+        # stream, on the caller's thread, and its result returned
+        bucket, slots = self._provider(provider)
+        with self._lock:
+            self.counters["requests"] += 1
+        try:
+            with slots:
+                for attempt in range(self.max_attempts):
+                    self._acquire(bucket)
+                    try:
+                        return fn()
+                    except Exception as e:
+                        if not is_retryable(e) or attempt == self.max_attempts - 1:
+                            raise
+                        self._back_off(bucket, e, attempt)
+        except Exception:
+            with self._lock:
+                self.counters["failures"] += 1
+            raise
+
+    def _acquire(self, bucket):
+        waited = bucket.acquire()
+        with self._lock:
+            self.counters["throttled_seconds"] += waited
+
+    def _back_off(self, bucket, error, attempt):
+        delay = retry_after(error) or backoff_delay(attempt)
+        if status_code(error) == 429:
+            bucket.pause(delay)
+        with self._lock:
+            self.counters["retries"] += 1
+        time.sleep(delay)
+
+    def _drive(self, provider, key, factory, flight):
+        # Runs the upstream request on its own thread so it completes for the
+        # remaining readers even if the one that started it goes away
+        bucket, slots = self._provider(provider)
+        error = None
+        try:
+            with slots:
+                for attempt in range(self.max_attempts):
+                    self._acquire(bucket)
+                    try:
+                        for chunk in factory():
+                            flight.append(chunk)
+                        break
+                    except Exception as e:
+                        if flight.chunks or not is_retryable(e) or attempt == self.max_attempts - 1:
+                            raise
+                        self._back_off(bucket, e, attempt)
+        except Exception as e:
+            error = e
+            with self._lock:
+                self.counters["failures"] += 1
+        finally:
+            with self._lock:
+                if key is not None and self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.finish(error)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "in_flight": len(self._flights)}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_stream
+import tokens
+import tracing
+
+# Pages longer than one chunk are summarized section by section (map) and the
+# section summaries are combined into the requested summary (reduce)
+CHUNK_TOKENS = 3000
+CHUNK_OVERLAP = 100
+MAX_PARALLEL = 4
+MAP_MAX_TOKENS = 300
+MAX_COLLAPSE_ROUNDS = 3
+
+MAP_PROMPT = ("Summarize the following section of a longer document. Keep the key facts, "
+              "names and figures:\n\n{content}")
+REDUCE_PROMPT = ("The following are summaries of consecutive sections of one document. Combine "
+                 "them into a single {summary_type} of the whole document in {language}:\n\n{summaries}")
+
+
+def needs_map_reduce(content, chunk_tokens=CHUNK_TOKENS):
+    return tokens.count_tokens(content) > chunk_tokens
+
+
+def split_sections(content, chunk_tokens=CHUNK_TOKENS):
+    return tokens.chunk_text(content, chunk_tokens, CHUNK_OVERLAP)
+
+
+def map_summaries(provider, api_key, model, sections, max_parallel=MAX_PARALLEL):
+    # Summarizes every section concurrently, so wall time follows the slowest one.
+    # Runs off the script thread, so no Streamlit calls in here.
+    def summarize_section(section):
+        return llm_stream.complete_text(
+            provider, api_key, model,
+            [{"role": "user", "content": MAP_PROMPT.format(content=section)}],
+            max_tokens=MAP_MAX_TOKENS, temperature=0.3,
+        ).strip()
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        return list(pool.map(tracing.bind(summarize_section), sections))
+
+
+def reduce_messages(provider, api_key, model, summaries, summary_type, language,
+                    chunk_tokens=CHUNK_TOKENS, max_parallel=MAX_PARALLEL):
+    # Collapses section summaries until they fit one prompt, then returns the
+    # messages for the final (streamed) reduce call
+    joined = "\n\n".join(summaries)
+    for _ in range(MAX_COLLAPSE_ROUNDS):
+        if not needs_map_reduce(joined, chunk_tokens):
+            break
+        summaries = map_summaries(provider, api_key, model, split_sections(joined, chunk_tokens), max_parallel)
+        joined = "\n\n".join(summaries)
+    prompt = REDUCE_PROMPT.format(summary_type=summary_type.lower(), language=language, summaries=joined)
+    return [{"role": "user", "content": prompt}]
@@ -0,0 +1,30 @@
+import tiktoken
+
+ENCODING_NAME = "cl100k_base"  # tokenizer of text-embedding-ada-002, gpt-3.5-turbo and gpt-4
+
+_encoding = None
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(ENCODING_NAME)
+    return _encoding
+
+
+def count_tokens(text):
+    # cl100k for every provider: exact for OpenAI, an estimate for the others
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def chunk_text(text, chunk_tokens, overlap):
+    # Windows of chunk_tokens tokens, consecutive windows sharing overlap tokens
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    step = chunk_tokens - overlap
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(encoding.decode(tokens[start:start + chunk_tokens]))
+        if start + chunk_tokens >= len(tokens):
+            break
+    return chunks
@@ -0,0 +1,147 @@
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+import streamlit as st
+
+TRACES_KEPT = 50
+
+# Stages recorded by the pipelines, in the order they usually run
+STAGES = ("fetch", "parse", "pdf_extract", "chunk", "embedding", "chroma_query", "chroma_write",
+          "retrieval", "generation")
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    # One request as seen by the user: timed stages (spans) on a common clock,
+    # with extra attributes such as time to first token and token counts
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self.seconds = None
+        self.spans = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, **attrs):
+        # Called when a stage ends; spans from worker threads may overlap
+        start = time.perf_counter() - seconds - self._t0
+        with self._lock:
+            self.spans.append({"stage": stage, "start_ms": start * 1000, "ms": seconds * 1000, **attrs})
+
+    def breakdown(self):
+        # Milliseconds per stage, summed over repeated spans (parallel work can exceed the total)
+        totals = {}
+        for span in self.spans:
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["ms"]
+        return totals
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "total_ms": self.seconds * 1000 if self.seconds is not None else None,
+            "stages": self.breakdown(),
+            "spans": list(self.spans),
+        }
+
+
+def current():
+    return _current.get()
+
+
+def session_traces():
+    return st.session_state.setdefault("traces", [])
+
+
+@contextlib.contextmanager
+def trace(label, store=None):
+    # Makes a new trace current for the block; the finished trace is appended to
+    # store, the session's trace history by default
+    if store is None:
+        store = session_traces()
+    new = Trace(label)
+    token = _current.set(new)
+    try:
+        yield new
+    finally:
+        _current.reset(token)
+        new.seconds = time.perf_counter() - new._t0
+        store.append(new)
+        del store[:-TRACES_KEPT]
+
+
+@contextlib.contextmanager
+def stage(name, **attrs):
+    # Times the block as one span of the current trace (no-op outside a trace).
+    # The yielded dict takes attributes known only at the end, like counts.
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(name, time.perf_counter() - started, **attrs)
+
+
+def record(name, seconds, **attrs):
+    # For stages timed elsewhere, recorded right as they end
+    active = current()
+    if active is not None:
+        active.add(name, seconds, **attrs)
+
+
+def bind(fn):
+    # Work handed to another thread runs in the caller's trace
+    active = current()
+
+    def run(*args, **kwargs):
+        token = _current.set(active)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def traced_stream(chunks, name="generation", count_tokens=None, **attrs):
+    # Passes a text stream through, recording time to first chunk, total time
+    # and (with count_tokens) the output tokens once the stream ends
+    started = time.perf_counter()
+    first = None
+    parts = []
+    try:
+        for chunk in chunks:
+            if first is None:
+                first = time.perf_counter() - started
+            parts.append(chunk)
+            yield chunk
+    finally:
+        if current() is not None:
+            attrs["ttft_ms"] = first * 1000 if first is not None else None
+            if count_tokens:
+                attrs["tokens_out"] = count_tokens("".join(parts))
+            record(name, time.perf_counter() - started, **attrs)
+
+
+def export_json(traces):
+    return json.dumps([t.to_dict() for t in traces], indent=2, default=str)
+
+
+def sidebar_panel():
+    # Stage breakdown of the latest request plus a JSON export of the history
+    traces = st.session_state.get("traces")
+    if not traces:
+        return
+    with st.sidebar.expander("Latency breakdown"):
+        latest = traces[-1]
+        st.caption(f"{latest.label}: {latest.seconds * 1000:.0f} ms")
+        rows = []
+        for span in sorted(latest.spans, key=lambda s: s["start_ms"]):
+            rows.append({key: round(value, 1) if isinstance(value, float) else value
+                         for key, value in span.items()})
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        st.download_button("Export traces (JSON)", export_json(traces),
+                           file_name="traces.json", mime="application/json")
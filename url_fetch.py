@@ -0,0 +1,189 @@
+import codecs
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import html_extract
+import tracing
+
+TIMEOUT = (5, 15)  # (connect, read) seconds
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 256
+POOL_SIZE = 16
+USER_AGENT = "Mozilla/5.0 (compatible; HomeworkApp/1.0)"
+
+# Streaming fetch budgets
+DEADLINE = 20  # seconds for the whole download
+MAX_BYTES = 2 * 1024 * 1024
+MAX_CHARS = html_extract.MAX_CHARS
+READ_CHUNK = 16 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # One keep-alive connection pool shared by every fetch in the process
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+class _Entry:
+    def __init__(self, text, etag, last_modified):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+
+
+class FetchCache:
+    # Parsed page text per (url, parser), revalidated with ETag / Last-Modified after the TTL
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_fresh(self, entry):
+        return time.monotonic() - entry.fetched_at < self.ttl
+
+
+cache = FetchCache()
+
+
+def fetch_text(url, parse, timeout=TIMEOUT):
+    # parse(content_bytes) -> text. Fresh cache hits never touch the network.
+    key = (url, getattr(parse, "__qualname__", repr(parse)))
+    entry = cache.get(key)
+    if entry is not None and cache.is_fresh(entry):
+        cache.hits += 1
+        tracing.record("fetch", 0.0, url=url, cache="hit")
+        return entry.text
+
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    with tracing.stage("fetch", url=url) as span:
+        response = get_session().get(url, headers=headers, timeout=timeout)
+        span["bytes"] = len(response.content)
+        span["cache"] = "revalidated" if response.status_code == 304 and entry is not None else "miss"
+    if response.status_code == 304 and entry is not None:
+        cache.revalidated += 1
+        entry.fetched_at = time.monotonic()
+        return entry.text
+    response.raise_for_status()
+
+    cache.misses += 1
+    with tracing.stage("parse", url=url):
+        text = parse(response.content)
+    cache.put(key, _Entry(text, response.headers.get("ETag"), response.headers.get("Last-Modified")))
+    return text
+
+
+def fetch_many(urls, parse, max_workers=8, timeout=TIMEOUT):
+    # Fetches all urls concurrently; returns {url: text or the exception raised}
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    def fetch(url):
+        try:
+            return fetch_text(url, parse, timeout)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        return dict(zip(urls, pool.map(tracing.bind(fetch), urls)))
+
+
+def _read_before(response, deadline_at, read_timeout):
+    # Next bytes of a streamed body, b"" at the end of the body or once deadline_at
+    # (a time.monotonic() value) passes. Errors surface as requests exceptions.
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        return b""
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        sock.settimeout(min(read_timeout, remaining))
+    try:
+        return response.raw.read1(READ_CHUNK, decode_content=True)
+    except urllib3.exceptions.ReadTimeoutError as e:
+        if time.monotonic() >= deadline_at:
+            return b""
+        raise requests.exceptions.ReadTimeout(e) from e
+    except urllib3.exceptions.ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e) from e
+    except urllib3.exceptions.DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e) from e
+
+
+def fetch_main_content(url, timeout=TIMEOUT, deadline=DEADLINE, max_bytes=MAX_BYTES,
+                       max_chars=MAX_CHARS):
+    # Streams the page through an incremental extractor and stops reading as soon
+    # as enough main content is found or the time/byte budget runs out. Returns
+    # the container text, or None when the page has no main content container.
+    # The deadline holds even against servers that trickle bytes: each read takes
+    # whatever has arrived, with a socket timeout cut down to the time left.
+    extractor = html_extract.StreamingExtractor(max_chars=max_chars)
+    connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    started = time.monotonic()
+    received = 0
+    decoder = None
+    parse_seconds = 0.0  # reading and parsing interleave; the parse share is timed separately
+    traced_from = time.perf_counter()
+    with get_session().get(url, timeout=(connect_timeout, min(read_timeout, deadline)), stream=True) as response:
+        response.raise_for_status()
+        while True:
+            chunk = _read_before(response, started + deadline, read_timeout)
+            if not chunk:
+                break
+            parse_started = time.perf_counter()
+            if decoder is None:
+                declared = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+                encoding = html_extract.detect_encoding(chunk, declared)
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            chunk = chunk[:max_bytes - received]
+            received += len(chunk)
+            extractor.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - parse_started
+            if extractor.done or received >= max_bytes:
+                break
+    parse_started = time.perf_counter()
+    result = extractor.result()
+    parse_seconds += time.perf_counter() - parse_started
+    tracing.record("fetch", time.perf_counter() - traced_from - parse_seconds, url=url, bytes=received)
+    tracing.record("parse", parse_seconds, url=url, chars=len(result or ""))
+    return result
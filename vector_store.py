@@ -0,0 +1,106 @@
+import hashlib
+import re
+import resource
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+PERSIST_PATH = "./chroma_db"
+MEMORY_BUDGET_BYTES = 512 * 1024 * 1024  # loaded vector segments across all collections
+MAX_OPEN_COLLECTIONS = 32
+IDLE_SECONDS = 30 * 60
+COLLECTION_PREFIX = "hw5"
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_-]+")
+
+
+def collection_name(*namespace):
+    # Chroma names: 3-63 chars of [a-zA-Z0-9._-], alphanumeric at both ends. The
+    # digest keeps namespaces distinct once they are sanitized and truncated.
+    raw = "/".join(str(part) for part in namespace)
+    readable = "-".join(filter(None, (_NAME_RE.sub("_", str(part)).strip("_-") for part in namespace)))
+    suffix = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+    readable = readable[:63 - len(COLLECTION_PREFIX) - len(suffix) - 2].strip("_-")
+    return "-".join(filter(None, (COLLECTION_PREFIX, readable, suffix)))
+
+
+def memory_budget_supported(chromadb):
+    # Only the Python segment backend (chromadb < 1.0) applies the LRU segment
+    # cache settings; the Rust backend of 1.x silently ignores them
+    return int(chromadb.__version__.split(".")[0]) < 1
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # No procfs (macOS): fall back to peak RSS, reported in bytes there
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StoreManager:
+    # One PersistentClient per process with a namespaced collection per user and
+    # course. Chroma's LRU segment cache unloads the least recently used vector
+    # indexes once the loaded ones outgrow the memory budget (chromadb 0.6, as
+    # pinned in requirements.txt; see memory_budget_supported). Collection
+    # handles are reused between script runs and released when idle longer than
+    # idle_seconds or beyond max_collections; releasing a handle frees no index
+    # memory, it only bounds the bookkeeping here.
+    def __init__(self, chromadb, path=PERSIST_PATH, memory_budget_bytes=MEMORY_BUDGET_BYTES,
+                 max_collections=MAX_OPEN_COLLECTIONS, idle_seconds=IDLE_SECONDS):
+        settings = chromadb.config.Settings(
+            anonymized_telemetry=False,
+            chroma_segment_cache_policy="LRU",
+            chroma_memory_limit_bytes=memory_budget_bytes,
+        )
+        self.client = chromadb.PersistentClient(path=path, settings=settings)
+        self.memory_budget_bytes = memory_budget_bytes if memory_budget_supported(chromadb) else None
+        self.max_collections = max_collections
+        self.idle_seconds = idle_seconds
+        self.handles_released = 0
+        self._open = OrderedDict()  # name -> (collection, last_used)
+        self._lock = threading.Lock()
+
+    def collection(self, namespace, embedding_function):
+        # namespace: tuple such as (user, course)
+        name = collection_name(*namespace)
+        with self._lock:
+            if name in self._open:
+                collection = self._open.pop(name)[0]
+            else:
+                collection = self.client.get_or_create_collection(name=name, embedding_function=embedding_function)
+            self._open[name] = (collection, time.monotonic())
+            self._release_handles()
+        return collection
+
+    def _release_handles(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._open:
+            name, (_, last_used) = next(iter(self._open.items()))
+            if len(self._open) <= self.max_collections and last_used >= cutoff:
+                break
+            del self._open[name]
+            self.handles_released += 1
+
+    def stats(self):
+        # budget_mb is None when the installed chromadb cannot enforce the budget
+        with self._lock:
+            self._release_handles()
+            collections = [collection for collection, _ in self._open.values()]
+        vectors = 0
+        for collection in collections:
+            try:
+                vectors += collection.count()
+            except Exception:
+                pass
+        budget = self.memory_budget_bytes
+        return {
+            "collections_open": len(collections),
+            "vectors": vectors,
+            "handles_released": self.handles_released,
+            "rss_mb": current_rss_bytes() / (1024 * 1024),
+            "budget_mb": budget / (1024 * 1024) if budget is not None else None,
+        }